@@ -1,11 +1,14 @@
+from typing import Optional
 from timer import Timer
+from rate_scheduler import RateScheduler, SKIP
 import threading
 
 
 class AppLoop:
-    def __init__(self) -> None:
+    def __init__(self, rate: Optional[float] = None, overrun_policy: str = SKIP) -> None:
         self.timer = Timer()
         self.stop_event = threading.Event()
+        self.scheduler = None if rate is None else RateScheduler(rate, overrun_policy)
 
     def startup(self) -> None:
         pass
@@ -26,11 +29,17 @@ class AppLoop:
         self.startup()
         self.timer.reset()
 
+        if self.scheduler is not None:
+            self.scheduler.reset()
+
         try:
             while self.is_running():
                 t = self.timer.t()
                 dt = self.timer.dt()
                 self.update(t, dt)
+
+                if self.scheduler is not None:
+                    self.scheduler.wait()
         finally:
             self.shutdown()
 
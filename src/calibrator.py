@@ -1,94 +1,188 @@
 from __future__ import annotations
 from rgbd_stream import RGBDStream, RGBDFrame
 from robot import Robot
+from marker_tracker import MarkerTracker
+from kabsch import OnlineKabsch
+from data_management import ColumnarDataStore
+from stoppable_thread import StoppableThread
 from numpy.typing import NDArray
 import numpy as np
 from typing import Tuple
+import threading
 import cv2
 
 
+class PoseHistory:
+    '''Ring buffer of timestamped robot positions, sampled by linear interpolation.'''
+
+    def __init__(self, capacity: int = 2048) -> None:
+        self.store = ColumnarDataStore(column_names=['timestamp', 'position'], dtypes=[np.float64, np.float64], shapes=[(), (3,)], capacity=capacity, ring=True)
+        self.lock = threading.Condition()
+
+    def record(self, timestamp: float, position: NDArray) -> None:
+        with self.lock:
+            self.store.append_row((timestamp, position))
+            self.lock.notify_all()
+
+    def _latest_timestamp(self) -> float:
+        timestamps = self.store.get_column('timestamp')
+        return timestamps[-1] if len(timestamps) > 0 else -np.inf
+
+    def wait_until(self, timestamp: float, timeout: float) -> bool:
+        with self.lock:
+            return self.lock.wait_for(lambda: self._latest_timestamp() >= timestamp, timeout)
+
+    def time_range(self) -> Tuple[float, float] | None:
+        with self.lock:
+            timestamps = self.store.get_column('timestamp')
+            return None if len(timestamps) == 0 else (float(timestamps[0]), float(timestamps[-1]))
+
+    def sample(self, timestamp: float) -> NDArray | None:
+        with self.lock:
+            timestamps, positions = self.store.get_all_columns(ordered=True)
+
+            if len(timestamps) == 0 or not timestamps[0] <= timestamp <= timestamps[-1]:
+                return None
+
+            i = int(np.searchsorted(timestamps, timestamp))
+            if i == 0:
+                return positions[0].copy()
+
+            t0, t1 = timestamps[i - 1], timestamps[i]
+            alpha = (timestamp - t0) / (t1 - t0) if t1 > t0 else 1.0
+            return (1.0 - alpha) * positions[i - 1] + alpha * positions[i]
+
+
+def _detect_markers(stop_event: threading.Event, calibrator: 'Calibrator') -> None:
+    while not stop_event.is_set() and calibrator.is_calibrating():
+        calibrator.stream.wait_for_frames()
+        frame = calibrator.stream.get_frame()
+
+        marker_position, mask = calibrator._find_marker_position(frame)
+        calibrator._update_display(frame, mask)
+
+        if marker_position is None:
+            continue
+
+        # a frame can be newer than the last robot pose recorded by the control loop
+        timestamp = frame.timestamp - calibrator.camera_latency
+        calibrator.pose_history.wait_until(timestamp, calibrator.pose_wait_timeout)
+        robot_position = calibrator.pose_history.sample(timestamp)
+        if robot_position is None:
+            calibrator._count_unpaired_detection(frame)
+            continue
+
+        calibrator.unpaired_detections = 0
+        calibrator._add_pair(marker_position, robot_position)
+
+
 class Calibrator:
-    def __init__(self, stream: RGBDStream, robot: Robot, marker_color: NDArray, N: int = 1000) -> None:
+    '''Pairs marker positions seen by the camera with robot positions; frames must be stamped with time.perf_counter().'''
+
+    UNPAIRED_DETECTIONS_WARNING = 30
+
+    def __init__(self, stream: RGBDStream, robot: Robot, marker_color: NDArray, N: int = 1000, tracker: MarkerTracker | None = None, estimator: OnlineKabsch | None = None, stop_on_convergence: bool = True, threaded: bool = False, camera_latency: float = 0.0, pose_history_capacity: int = 2048, pose_wait_timeout: float = 0.05) -> None:
         self.robot = robot
         self.stream = stream
         self.marker_color = marker_color
+        self.tracker = MarkerTracker(marker_color) if tracker is None else tracker
         self.N = N
-        self.world_space_points = []
-        self.robot_space_points = []
+        self.estimator = OnlineKabsch() if estimator is None else estimator
+        self.stop_on_convergence = stop_on_convergence
         self.calibration_matrix = None
+        self.threaded = threaded
+        self.camera_latency = camera_latency
+        self.pose_wait_timeout = pose_wait_timeout
+        self.pose_history = PoseHistory(pose_history_capacity)
+        self.unpaired_detections = 0
+        self._display = None
+        self._display_lock = threading.Lock()
 
         if not self.stream.is_running():
             self.stream.start()
 
+        self.detection_thread = None
+        if threaded:
+            self.detection_thread = StoppableThread(_detect_markers, self, name='MarkerDetectionThread')
+            self.detection_thread.start()
+
     def _find_marker_position(self, frame: RGBDFrame) -> Tuple[NDArray | None, NDArray]:
-        difference = frame.resized_rgb - self.marker_color
-        mask = np.sum(difference * difference, axis=-1) < 0.03
-        indices_y, indices_x = np.where(mask)
+        return self.tracker.find(frame)
 
-        if len(indices_x) == 0:
-            return None, mask
+    def _get_robot_position(self) -> NDArray:
+        return self.robot.get_pose(Robot.TRANSLATION)
 
-        marker_points = frame.camera.screen_to_world(
-            frame.xyz[indices_y, indices_x],
-            width=frame.xyz.shape[1],
-            height=frame.xyz.shape[0])
+    def is_calibrating(self) -> bool:
+        if self.stop_on_convergence and self.estimator.has_converged():
+            return False
+        return self.estimator.seen < self.N
 
-        return np.mean(marker_points, axis=0), mask
+    def record_robot_pose(self) -> None:
+        position = self._get_robot_position()
+        self.pose_history.record(self.robot.state.timestamp, position)
 
-    def _get_robot_position(self) -> NDArray:
-        return self.robot.get_pose(Robot.TRANSLATION)
+    def _render_frame(self, frame: RGBDFrame, mask: NDArray) -> NDArray:
+        mask = cv2.resize(
+            mask.astype(np.uint8), (frame.rgb.shape[1], frame.rgb.shape[0]))[:, :, None]
+        return cv2.cvtColor(frame.rgb, cv2.COLOR_RGB2BGR) * (1 - mask)
 
-    def _kabsch_algorithm(self, P: NDArray, Q: NDArray) -> Tuple[NDArray, NDArray]:
-        centroid_P = np.mean(P, axis=0)
-        centroid_Q = np.mean(Q, axis=0)
+    def _update_display(self, frame: RGBDFrame, mask: NDArray) -> None:
+        bgr = self._render_frame(frame, mask)
+        with self._display_lock:
+            self._display = bgr
 
-        P_centered = P - centroid_P
-        Q_centered = Q - centroid_Q
+    def show_frame(self) -> None:
+        with self._display_lock:
+            bgr, self._display = self._display, None
 
-        H = P_centered.T @ Q_centered
-        U, S, Vt = np.linalg.svd(H)
-        R = Vt.T @ U.T
+        if bgr is not None:
+            cv2.imshow('Camera Feed', bgr)
+            cv2.waitKey(1)
 
-        if np.linalg.det(R) < 0:
-            Vt[-1, :] *= -1
-            R = Vt.T @ U.T
+    def _count_unpaired_detection(self, frame: RGBDFrame) -> None:
+        self.unpaired_detections += 1
+        if self.unpaired_detections != self.UNPAIRED_DETECTIONS_WARNING:
+            return
 
-        t = centroid_Q - R @ centroid_P
+        time_range = self.pose_history.time_range()
+        history = 'empty' if time_range is None else f'{time_range[0]:.3f} to {time_range[1]:.3f} s'
+        print(f"Warning: the last {self.unpaired_detections} marker detections could not be paired with a robot pose. "
+              f"Frame time {frame.timestamp - self.camera_latency:.3f} s (after camera_latency), robot pose history {history}. "
+              "Call calibrate() or record_robot_pose() every control tick, and check that the stream stamps frames with time.perf_counter().")
 
-        return R, t
+    def progress(self) -> float:
+        return 100.0 * self.estimator.seen / self.N
 
-    def is_calibrating(self) -> bool:
-        return len(self.world_space_points) < self.N
+    def _add_pair(self, marker_position: NDArray, robot_position: NDArray) -> None:
+        self.estimator.add(marker_position, robot_position)
 
     def calibrate(self, display_frame: bool = True) -> None:
+        if self.threaded:
+            self.record_robot_pose()
+            if display_frame:
+                self.show_frame()
+            return
+
         self.stream.wait_for_frames()
         frame = self.stream.get_frame()
 
         marker_position, mask = self._find_marker_position(frame)
 
         if display_frame:
-            mask = cv2.resize(
-                mask.astype(np.uint8), (frame.rgb.shape[1], frame.rgb.shape[0]))[:, :, None]
-            bgr = cv2.cvtColor(frame.rgb, cv2.COLOR_RGB2BGR) * (1 - mask)
-            cv2.imshow('Camera Feed', bgr)
+            cv2.imshow('Camera Feed', self._render_frame(frame, mask))
             cv2.waitKey(1)
 
         if marker_position is None:
             return
 
-        robot_position = self._get_robot_position()
-
-        self.world_space_points.append(marker_position)
-        self.robot_space_points.append(robot_position)
+        self._add_pair(marker_position, self._get_robot_position())
 
-        print(f"Calibrating: {100.0 * len(self.world_space_points) / self.N}%")
+    def stop(self) -> None:
+        if self.detection_thread is not None:
+            self.detection_thread.stop()
+            self.detection_thread.join()
 
     def compute_calibration_matrix(self) -> NDArray:
-        rotation, translation = self._kabsch_algorithm(
-            np.array(self.world_space_points), np.array(self.robot_space_points))
-
-        matrix = np.eye(4)
-        matrix[0:3, 0:3] = rotation
-        matrix[0:3, 3] = translation
-
-        return matrix
+        self.stop()
+        self.calibration_matrix = self.estimator.matrix()
+        return self.calibration_matrix
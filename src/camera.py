@@ -1,6 +1,39 @@
 import numpy as np
 from numpy.typing import NDArray
 
+PERSPECTIVE_EPSILON = 1e-6
+
+
+def _result_array(points: NDArray, out: NDArray = None) -> NDArray:
+    if out is not None:
+        return out
+    dtype = points.dtype if np.issubdtype(points.dtype, np.floating) else np.float64
+    return np.empty(points.shape, dtype=dtype)
+
+
+def apply_homogeneous(matrix: NDArray, points: NDArray, out: NDArray = None) -> NDArray:
+    points = np.asarray(points)
+    out = _result_array(points, out)
+    matrix = matrix.astype(out.dtype, copy=False)
+    np.matmul(points, matrix[0:3, 0:3].T, out=out)
+    out += matrix[0:3, 3]
+    return out
+
+
+def _perspective_divide(xyz: NDArray, offset: NDArray) -> NDArray:
+    np.divide(xyz[..., 0:2], xyz[..., 2:3] + PERSPECTIVE_EPSILON, out=xyz[..., 0:2])
+    xyz[..., 0:2] += offset.astype(xyz.dtype, copy=False)
+    return xyz
+
+
+def _perspective_multiply(xyz: NDArray, offset: NDArray, out: NDArray = None) -> NDArray:
+    xyz = np.asarray(xyz)
+    out = _result_array(xyz, out)
+    np.subtract(xyz[..., 0:2], offset.astype(out.dtype, copy=False), out=out[..., 0:2])
+    out[..., 0:2] *= xyz[..., 2:3]
+    out[..., 2] = xyz[..., 2]
+    return out
+
 
 class Intrinsics:
     def __init__(self, width: float, height: float, fx: float, fy: float, px: float, py: float, orthographic: bool = False) -> None:
@@ -8,64 +41,128 @@ class Intrinsics:
         self.px, self.py = px / width, py / height
         self.orthographic = orthographic
 
-    def camera_to_screen(self, XYZ: NDArray, width: int, height: int) -> NDArray:
-        if self.orthographic:
-            x = XYZ[..., 0] * self.fx + self.px
-            y = XYZ[..., 1] * self.fy + self.py
-        else:
-            x = XYZ[..., 0] / (XYZ[..., 2] + 1e-6) * self.fx + self.px
-            y = XYZ[..., 1] / (XYZ[..., 2] + 1e-6) * self.fy + self.py
-
-        z = XYZ[..., 2]
-
-        return np.stack([width * x, height * y, z], axis=-1)
+    def screen_offset(self, width: int, height: int) -> NDArray:
+        return np.array([width * self.px, height * self.py])
 
-    def screen_to_camera(self, xyz: NDArray, width: int, height: int) -> NDArray:
+    def screen_matrix(self, width: int, height: int) -> NDArray:
+        matrix = np.eye(4)
+        matrix[0, 0] = width * self.fx
+        matrix[1, 1] = height * self.fy
+        # perspective cameras add the principal point offset after the divide
         if self.orthographic:
-            X = (xyz[..., 0] / width - self.px) / self.fx
-            Y = (xyz[..., 1] / height - self.py) / self.fy
-        else:
-            X = ((xyz[..., 0] / width - self.px) / self.fx) * xyz[..., 2]
-            Y = ((xyz[..., 1] / height - self.py) / self.fy) * xyz[..., 2]
+            matrix[0:2, 3] = self.screen_offset(width, height)
+        return matrix
 
-        Z = xyz[..., 2]
+    def camera_to_screen(self, XYZ: NDArray, width: int, height: int, out: NDArray = None) -> NDArray:
+        xyz = apply_homogeneous(self.screen_matrix(width, height), XYZ, out)
+        return xyz if self.orthographic else _perspective_divide(xyz, self.screen_offset(width, height))
 
-        return np.stack([X, Y, Z], axis=-1)
+    def screen_to_camera(self, xyz: NDArray, width: int, height: int, out: NDArray = None) -> NDArray:
+        matrix = np.linalg.inv(self.screen_matrix(width, height))
+        if not self.orthographic:
+            xyz = _perspective_multiply(xyz, self.screen_offset(width, height))
+        return apply_homogeneous(matrix, xyz, out)
 
 
 class Camera:
-    def __init__(self, intrinsics: Intrinsics, position: NDArray, rotation_matrix: NDArray) -> None:
+    '''Pinhole or orthographic camera; projection matrices are cached per image size until the pose changes.'''
+
+    def __init__(self, intrinsics: Intrinsics, position: NDArray, rotation_matrix: NDArray, inverse_rotation_matrix: NDArray = None) -> None:
         self.intrinsics = intrinsics
         self.position = position
         self.rotation_matrix = rotation_matrix
-        self.inverse_rotation_matrix = np.linalg.inv(self.rotation_matrix)
-
-    def world_to_camera(self, XYZ: NDArray) -> NDArray:
-        XYZ = XYZ - self.position
-        XYZ = XYZ @ self.inverse_rotation_matrix.T
-        return XYZ
-
-    def camera_to_screen(self, XYZ: NDArray, width: int, height: int) -> NDArray:
-        return self.intrinsics.camera_to_screen(XYZ, width, height)
-
-    def world_to_screen(self, XYZ: NDArray, width: int, height: int) -> NDArray:
-        return self.camera_to_screen(self.world_to_camera(XYZ), width, height)
-
-    def screen_to_camera(self, xyz: NDArray, width: int, height: int) -> NDArray:
-        return self.intrinsics.screen_to_camera(xyz, width, height)
-
-    def camera_to_world(self, XYZ: NDArray) -> NDArray:
-        XYZ = XYZ @ self.rotation_matrix.T
-        XYZ += self.position
-        return XYZ
-
-    def screen_to_world(self, xyz: NDArray, width: int, height: int) -> NDArray:
-        return self.camera_to_world(self.screen_to_camera(xyz, width, height))
-
-    def get_clip_mask(self, xyz: NDArray, width: int, height: int, depth: NDArray = None) -> NDArray:
-        is_valid = (xyz[..., 0] >= 0) & (xyz[..., 0] <= width - 1)
-        is_valid &= (xyz[..., 1] >= 0) & (xyz[..., 1] <= height - 1)
-        is_valid &= (xyz[..., 2] > 0)
+        # rotation matrices are orthonormal, so the transpose is the inverse
+        self.inverse_rotation_matrix = rotation_matrix.T if inverse_rotation_matrix is None else inverse_rotation_matrix
+
+    @property
+    def position(self) -> NDArray:
+        return self._position
+
+    @position.setter
+    def position(self, position: NDArray) -> None:
+        self._position = position
+        self._invalidate()
+
+    @property
+    def rotation_matrix(self) -> NDArray:
+        return self._rotation_matrix
+
+    @rotation_matrix.setter
+    def rotation_matrix(self, rotation_matrix: NDArray) -> None:
+        self._rotation_matrix = rotation_matrix
+        self._invalidate()
+
+    @property
+    def inverse_rotation_matrix(self) -> NDArray:
+        return self._inverse_rotation_matrix
+
+    @inverse_rotation_matrix.setter
+    def inverse_rotation_matrix(self, inverse_rotation_matrix: NDArray) -> None:
+        self._inverse_rotation_matrix = inverse_rotation_matrix
+        self._invalidate()
+
+    def _invalidate(self) -> None:
+        self._matrices = {}
+
+    def _cached(self, key: tuple, compute) -> NDArray:
+        matrix = self._matrices.get(key)
+        if matrix is None:
+            matrix = self._matrices[key] = compute()
+        return matrix
+
+    def world_to_camera_matrix(self) -> NDArray:
+        def compute():
+            matrix = np.eye(4)
+            matrix[0:3, 0:3] = self.inverse_rotation_matrix
+            matrix[0:3, 3] = -self.inverse_rotation_matrix @ self.position
+            return matrix
+        return self._cached(('world_to_camera',), compute)
+
+    def camera_to_world_matrix(self) -> NDArray:
+        def compute():
+            matrix = np.eye(4)
+            matrix[0:3, 0:3] = self.rotation_matrix
+            matrix[0:3, 3] = self.position
+            return matrix
+        return self._cached(('camera_to_world',), compute)
+
+    def projection_matrix(self, width: int, height: int) -> NDArray:
+        return self._cached(('projection', width, height),
+                            lambda: self.intrinsics.screen_matrix(width, height) @ self.world_to_camera_matrix())
+
+    def unprojection_matrix(self, width: int, height: int) -> NDArray:
+        return self._cached(('unprojection', width, height),
+                            lambda: self.camera_to_world_matrix() @ np.linalg.inv(self.intrinsics.screen_matrix(width, height)))
+
+    def world_to_camera(self, XYZ: NDArray, out: NDArray = None) -> NDArray:
+        return apply_homogeneous(self.world_to_camera_matrix(), XYZ, out)
+
+    def camera_to_screen(self, XYZ: NDArray, width: int, height: int, out: NDArray = None) -> NDArray:
+        return self.intrinsics.camera_to_screen(XYZ, width, height, out)
+
+    def world_to_screen(self, XYZ: NDArray, width: int, height: int, out: NDArray = None) -> NDArray:
+        xyz = apply_homogeneous(self.projection_matrix(width, height), XYZ, out)
+        return xyz if self.intrinsics.orthographic else _perspective_divide(xyz, self.intrinsics.screen_offset(width, height))
+
+    def screen_to_camera(self, xyz: NDArray, width: int, height: int, out: NDArray = None) -> NDArray:
+        return self.intrinsics.screen_to_camera(xyz, width, height, out)
+
+    def camera_to_world(self, XYZ: NDArray, out: NDArray = None) -> NDArray:
+        return apply_homogeneous(self.camera_to_world_matrix(), XYZ, out)
+
+    def screen_to_world(self, xyz: NDArray, width: int, height: int, out: NDArray = None) -> NDArray:
+        if not self.intrinsics.orthographic:
+            # out may alias xyz, the matmul in apply_homogeneous copies its input on overlap
+            xyz = _perspective_multiply(xyz, self.intrinsics.screen_offset(width, height), out)
+        return apply_homogeneous(self.unprojection_matrix(width, height), xyz, out)
+
+    def get_clip_mask(self, xyz: NDArray, width: int, height: int, depth: NDArray = None, out: NDArray = None) -> NDArray:
+        xyz = np.asarray(xyz)
+        is_valid = np.greater_equal(xyz[..., 0], 0, out=out)
+        is_valid &= xyz[..., 0] <= width - 1
+        is_valid &= xyz[..., 1] >= 0
+        is_valid &= xyz[..., 1] <= height - 1
+        is_valid &= xyz[..., 2] > 0
 
         if depth is not None:
             x_index = np.clip(
@@ -76,13 +173,18 @@ class Camera:
 
         return is_valid
 
+    def project_and_clip(self, XYZ: NDArray, width: int, height: int, depth: NDArray = None, out: NDArray = None, mask: NDArray = None):
+        xyz = self.world_to_screen(XYZ, width, height, out)
+        return xyz, self.get_clip_mask(xyz, width, height, depth, mask)
+
     def clip_xyz(self, xyz: NDArray, width: int, height: int, depth: NDArray = None) -> NDArray:
+        xyz = np.asarray(xyz)
         is_valid = self.get_clip_mask(xyz, width, height, depth)
         return xyz[is_valid]
 
     def clip_XYZ(self, XYZ: NDArray, width: int, height: int, depth: NDArray = None) -> NDArray:
-        xyz = self.world_to_screen(XYZ, width, height)
-        is_valid = self.get_clip_mask(xyz, width, height, depth)
+        XYZ = np.asarray(XYZ)
+        _, is_valid = self.project_and_clip(XYZ, width, height, depth)
         return XYZ[is_valid]
 
     def forward(self) -> NDArray:
@@ -91,4 +193,9 @@ class Camera:
     def calibrate(self, transform: NDArray):
         self.position = transform[0:3, 0:3] @ self.position + transform[0:3, 3]
         self.rotation_matrix = transform[0:3, 0:3] @ self.rotation_matrix
-        self.inverse_rotation_matrix = np.linalg.inv(self.rotation_matrix)
+        self.inverse_rotation_matrix = self.rotation_matrix.T
+
+    def calibrated(self, transform: NDArray) -> 'Camera':
+        camera_to_world = transform @ self.camera_to_world_matrix()
+        rotation_matrix = camera_to_world[0:3, 0:3]
+        return Camera(self.intrinsics, camera_to_world[0:3, 3], rotation_matrix, rotation_matrix.T)
@@ -1,50 +1,155 @@
 from rgbd_stream import RGBDStream
+from camera import Camera
+from stoppable_thread import StoppableThread
 import numpy as np
 from numpy.typing import NDArray
+from typing import List, Tuple
+import threading
 import cv2
 
+POINT = 'point'
+ARROW = 'arrow'
+WAIT_INTERVAL = 0.1
+
+
+class OverlayCommands:
+    '''World space overlay primitives, projected together when drawn onto a frame.'''
+
+    def __init__(self) -> None:
+        self.points: List[NDArray] = []
+        self.primitives: List[Tuple[str, int, int, Tuple[float, ...]]] = []
+
+    def __len__(self) -> int:
+        return len(self.primitives)
+
+    def add_point(self, point: NDArray, radius: int, color: NDArray) -> None:
+        self.primitives.append((POINT, len(self.points), radius, tuple(color)))
+        # copied, as the caller may keep updating its arrays in place (e.g. state of a control thread)
+        self.points.append(np.array(point, dtype=np.float64))
+
+    def add_arrow(self, point1: NDArray, point2: NDArray, thickness: int, color: NDArray) -> None:
+        self.primitives.append((ARROW, len(self.points), thickness, tuple(color)))
+        self.points.append(np.array(point1, dtype=np.float64))
+        self.points.append(np.array(point2, dtype=np.float64))
+
+    def draw(self, rgb: NDArray, camera: Camera) -> None:
+        if len(self.primitives) == 0:
+            return
+
+        width, height = rgb.shape[1], rgb.shape[0]
+        xyz = camera.world_to_screen(np.stack(self.points), width, height)
+        pixels = xyz[:, 0:2].astype(np.int64).tolist()
+        is_visible = (xyz[:, 2] >= 0).tolist()
+
+        for kind, i, size, color in self.primitives:
+            if kind == POINT:
+                if is_visible[i]:
+                    cv2.circle(rgb, tuple(pixels[i]), radius=size, color=color, thickness=-1)
+            elif is_visible[i] and is_visible[i + 1]:
+                cv2.arrowedLine(rgb, tuple(pixels[i]), tuple(pixels[i + 1]), color=color, thickness=size)
+
+
+def _render_frames(stop_event: threading.Event, feed: 'CameraFeed') -> None:
+    while not stop_event.is_set() and feed.stream.is_running():
+        # waits in short intervals, so stop() is noticed even when the stream has stalled
+        if not feed.stream.wait_for_frames(timeout=WAIT_INTERVAL):
+            continue
+        feed._read_frame()
+
+        with feed._lock:
+            overlay = feed._submitted_overlay
+
+        overlay.draw(feed.rgb, feed.frame.camera)
+        bgr = cv2.cvtColor(feed.rgb, cv2.COLOR_RGB2BGR)
+
+        with feed._lock:
+            # an image that has not been shown yet is replaced, so the window never falls behind the camera
+            feed._image = bgr
+        feed._image_event.set()
+
 
 class CameraFeed:
-    def __init__(self, window_title: str, stream: RGBDStream, calibration_matrix: NDArray = np.eye(4)) -> None:
+    '''Shows a stream with world space overlays; with threaded=True they are composited on a render thread.'''
+
+    def __init__(self, window_title: str, stream: RGBDStream, calibration_matrix: NDArray = np.eye(4), threaded: bool = False, display_timeout: float = 0.1) -> None:
         self.window_title = window_title
         self.stream = stream
         self.calibration_matrix = calibration_matrix
+        self.threaded = threaded
+        self.display_timeout = display_timeout
+        self._camera = None
+        self._calibrated_camera = None
+        self._camera_calibration_matrix = None
+
+        self.overlay = OverlayCommands()
+        self._submitted_overlay = OverlayCommands()
+        self._lock = threading.Lock()
+        self._image = None
+        self._image_event = threading.Event()
+        self.render_thread = None
 
         if not self.stream.is_running():
             self.stream.start()
 
-        self._get_new_frame()
+        if threaded:
+            self.render_thread = StoppableThread(_render_frames, self, name='CameraFeedRenderThread', daemon=True)
+            self.render_thread.start()
+        else:
+            self._get_new_frame()
+
+    def _calibrate_camera(self, camera: Camera) -> Camera:
+        # streams hand out the same camera while the device pose is unchanged, so it is only calibrated once
+        if camera is not self._camera or self.calibration_matrix is not self._camera_calibration_matrix:
+            self._camera = camera
+            self._camera_calibration_matrix = self.calibration_matrix
+            self._calibrated_camera = camera.calibrated(self.calibration_matrix)
+        return self._calibrated_camera
 
     def _get_new_frame(self) -> None:
         self.stream.wait_for_frames()
+        self._read_frame()
+
+    def _read_frame(self) -> None:
         self.frame = self.stream.get_frame()
-        self.frame.camera.calibrate(self.calibration_matrix)
+        self.frame.camera = self._calibrate_camera(self.frame.camera)
         self.rgb = np.copy(self.frame.rgb)
 
     def draw_world_point(self, point: NDArray, radius: int, color: NDArray) -> None:
-        width, height = self.rgb.shape[1], self.rgb.shape[0]
-        x, y, z = self.frame.camera.world_to_screen(point, width, height)
+        self.overlay.add_point(point, radius, color)
 
-        if z < 0:
-            return
+    def draw_world_arrow(self, point1: NDArray, point2: NDArray, thickness: int, color: NDArray) -> None:
+        self.overlay.add_arrow(point1, point2, thickness, color)
+
+    def _show(self, bgr: NDArray) -> None:
+        cv2.imshow(self.window_title, bgr)
+        cv2.waitKey(1)
 
-        cv2.circle(self.rgb, (int(x), int(y)),
-                   radius=radius, color=color, thickness=-1)
+    def update_window(self) -> None:
+        overlay, self.overlay = self.overlay, OverlayCommands()
 
-    def draw_world_arrow(self, point1: NDArray, point2: NDArray, thickness: int, color: NDArray) -> None:
-        width, height = self.rgb.shape[1], self.rgb.shape[0]
-        x1, y1, z1 = self.frame.camera.world_to_screen(point1, width, height)
-        x2, y2, z2 = self.frame.camera.world_to_screen(point2, width, height)
+        if not self.threaded:
+            overlay.draw(self.rgb, self.frame.camera)
+            self._show(cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR))
+            self._get_new_frame()
+            return
 
-        if z1 < 0 or z2 < 0:
+        with self._lock:
+            self._submitted_overlay = overlay
+
+        if not self._image_event.wait(self.display_timeout):
             return
 
-        cv2.arrowedLine(self.rgb, (int(x1), int(y1)),
-                        (int(x2), int(y2)), color=color, thickness=thickness)
+        with self._lock:
+            bgr, self._image = self._image, None
+            self._image_event.clear()
 
-    def update_window(self) -> None:
-        bgr = cv2.cvtColor(self.rgb, cv2.COLOR_RGB2BGR)
-        cv2.imshow(self.window_title, bgr)
-        cv2.waitKey(1)
+        if bgr is not None:
+            self._show(bgr)
 
-        self._get_new_frame()
+    def stop(self) -> None:
+        if self.render_thread is not None:
+            self.render_thread.stop()
+            self.render_thread.join(timeout=1.0)
+            if self.render_thread.is_alive():
+                print(f'Warning: {self.render_thread.name} did not stop within 1 s')
+            self.render_thread = None
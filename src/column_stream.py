@@ -0,0 +1,187 @@
+from __future__ import annotations
+from typing import Any, Dict, Tuple
+from numpy.typing import DTypeLike, NDArray
+from stoppable_thread import StoppableThread
+import numpy as np
+import threading
+import queue
+import json
+import os
+
+HEADER_FILE_NAME = 'header.json'
+COLUMN_FILE_EXTENSION = '.bin'
+
+
+def write_header(dir_path: str, columns: Dict[str, Tuple[DTypeLike, Tuple[int, ...]]]) -> None:
+    header = {
+        'columns': [
+            {'name': name, 'dtype': np.dtype(dtype).str, 'shape': list(shape)}
+            for name, (dtype, shape) in columns.items()
+        ]
+    }
+
+    temporary_path = os.path.join(dir_path, HEADER_FILE_NAME + '.tmp')
+    with open(temporary_path, 'w') as file:
+        json.dump(header, file)
+    os.replace(temporary_path, os.path.join(dir_path, HEADER_FILE_NAME))
+
+
+def read_header(dir_path: str) -> Dict[str, Tuple[np.dtype, Tuple[int, ...]]]:
+    with open(os.path.join(dir_path, HEADER_FILE_NAME), 'r') as file:
+        header = json.load(file)
+
+    return {column['name']: (np.dtype(column['dtype']), tuple(column['shape'])) for column in header['columns']}
+
+
+def read_columns(dir_path: str, mmap: bool = True) -> Dict[str, NDArray]:
+    columns = read_header(dir_path)
+
+    # only rows complete in every column file are read, so a stream cut off by a crash reads back as its longest consistent prefix
+    rows = None
+    for name, (dtype, shape) in columns.items():
+        row_nbytes = dtype.itemsize * int(np.prod(shape, dtype=np.int64))
+        file_nbytes = os.path.getsize(os.path.join(dir_path, name + COLUMN_FILE_EXTENSION))
+        column_rows = file_nbytes // row_nbytes
+        rows = column_rows if rows is None else min(rows, column_rows)
+
+    arrays = {}
+    for name, (dtype, shape) in columns.items():
+        path = os.path.join(dir_path, name + COLUMN_FILE_EXTENSION)
+
+        if rows == 0:
+            arrays[name] = np.empty((0,) + shape, dtype=dtype)
+        elif mmap:
+            arrays[name] = np.memmap(path, dtype=dtype, mode='r', shape=(rows,) + shape)
+        else:
+            arrays[name] = np.fromfile(path, dtype=dtype, count=rows * int(np.prod(shape, dtype=np.int64))).reshape((rows,) + shape)
+
+    return arrays
+
+
+def _write_chunks(stop_event: threading.Event, writer: ColumnStreamWriter) -> None:
+    while not stop_event.is_set() or not writer._filled_chunks.empty():
+        try:
+            chunk, rows = writer._filled_chunks.get(timeout=0.1)
+        except queue.Empty:
+            continue
+
+        try:
+            for name, file in writer._files.items():
+                chunk[name][:rows].tofile(file)
+                file.flush()
+                if writer.durable:
+                    os.fsync(file.fileno())
+        except Exception as e:
+            # kept for the caller's thread, which would otherwise wait forever on chunks that are never written
+            writer._error = e
+            raise
+
+        writer._free_chunks.put(chunk)
+        with writer._written:
+            writer._pending_chunks -= 1
+            writer._written.notify_all()
+
+
+class ColumnStreamWriter:
+    '''Append-only column files written by a background thread; rows are dropped and counted while its queue is full.'''
+
+    WAIT_INTERVAL = 0.1
+
+    def __init__(self, dir_path: str, columns: Dict[str, Tuple[DTypeLike, Tuple[int, ...]]], chunk_size: int = 256, queue_chunks: int = 8, durable: bool = False) -> None:
+        if chunk_size < 1 or queue_chunks < 1:
+            raise ValueError('Chunk size and number of queued chunks must be counting numbers.')
+
+        os.makedirs(dir_path, exist_ok=True)
+        write_header(dir_path, columns)
+
+        self.dir_path = dir_path
+        self.column_names = list(columns.keys())
+        self.chunk_size = chunk_size
+        self.durable = durable
+        self.rows = 0
+        self.dropped = 0
+        self.closed = False
+
+        self._files = {name: open(os.path.join(dir_path, name + COLUMN_FILE_EXTENSION), 'ab') for name in self.column_names}
+        self._free_chunks = queue.Queue(maxsize=queue_chunks)
+        self._filled_chunks = queue.Queue(maxsize=queue_chunks)
+
+        for _ in range(queue_chunks):
+            self._free_chunks.put({
+                name: np.empty((chunk_size,) + tuple(shape), dtype=dtype)
+                for name, (dtype, shape) in columns.items()
+            })
+
+        self._chunk = None
+        self._chunk_rows = 0
+        self._pending_chunks = 0
+        self._written = threading.Condition()
+        self._error = None
+
+        self._thread = StoppableThread(_write_chunks, self, name=f'column_stream_writer_{os.path.basename(dir_path)}')
+        self._thread.start()
+
+    def _check_writer(self) -> None:
+        if self._error is not None:
+            raise RuntimeError(f'Column stream writer for {self.dir_path} failed: {self._error}') from self._error
+        if not self._thread.is_alive():
+            raise RuntimeError(f'Column stream writer thread for {self.dir_path} is not running.')
+
+    def append(self, *values: Any) -> None:
+        if self._error is not None:
+            self._check_writer()
+
+        if self._chunk is None:
+            try:
+                self._chunk = self._free_chunks.get_nowait()
+            except queue.Empty:
+                self.dropped += 1
+                return
+
+        for name, value in zip(self.column_names, values):
+            self._chunk[name][self._chunk_rows] = value
+
+        self._chunk_rows += 1
+        self.rows += 1
+
+        if self._chunk_rows == self.chunk_size:
+            self._submit_chunk()
+
+    def _submit_chunk(self) -> None:
+        with self._written:
+            self._pending_chunks += 1
+        self._filled_chunks.put((self._chunk, self._chunk_rows))
+        self._chunk = None
+        self._chunk_rows = 0
+
+    def flush(self) -> None:
+        if self._chunk is not None and self._chunk_rows > 0:
+            self._submit_chunk()
+
+        with self._written:
+            while self._pending_chunks:
+                self._check_writer()
+                self._written.wait(self.WAIT_INTERVAL)
+
+        self._check_writer()
+
+    def close(self) -> None:
+        if self.closed:
+            return
+
+        self.closed = True
+        try:
+            self.flush()
+        finally:
+            self._thread.stop()
+            self._thread.join()
+
+            for file in self._files.values():
+                file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
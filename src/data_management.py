@@ -1,5 +1,6 @@
 from typing import Any, Callable, Dict, Optional, List, Tuple, Union
 import threading
+import numpy as np
 import pandas as pd
 
 class DataBuffer:
@@ -77,19 +78,21 @@ class TabularDataStore:
             table[column_name].append(row_data[i])
         self._table.write(table)
 
-    def get_column(self, column: Union[int, str]) -> List[Any]:
-        table = self._table.read()
+    def _resolve_column_name(self, column: Union[int, str]) -> str:
         if isinstance(column, int):
             if column < 0 or column >= len(self.column_names):
                 raise IndexError("Column index out of range.")
-            column_name = self.column_names[column]
+            return self.column_names[column]
         elif isinstance(column, str):
-            column_name = column
-            if column_name not in table:
-                raise KeyError(f"Column '{column_name}' does not exist.")
+            if column not in self.column_names:
+                raise KeyError(f"Column '{column}' does not exist.")
+            return column
         else:
             raise TypeError("Column must be specified by index (int) or name (str).")
-        
+
+    def get_column(self, column: Union[int, str]) -> List[Any]:
+        column_name = self._resolve_column_name(column)
+        table = self._table.read()
         return table[column_name]
     
     def get_all_columns(self, ordered: bool = False) -> Union[Dict[str, List[Any]], Tuple[List[Any]]]:
@@ -114,4 +117,133 @@ class TabularDataStore:
         return len(self.get_column(0))
     
     def to_pandas(self):
-        return pd.DataFrame(self.get_all_columns(), columns=self.column_names)
\ No newline at end of file
+        return pd.DataFrame(self.get_all_columns(), columns=self.column_names)
+
+
+class RowShapeError(ValueError):
+    '''Raised when a value does not fit the per-row shape allocated for its column.'''
+
+
+class ColumnarDataStore(TabularDataStore):
+    '''TabularDataStore backed by one preallocated NumPy array per column, optionally a ring of the latest rows.'''
+
+    def __init__(
+        self,
+        columns: Optional[int] = None,
+        column_names: Optional[List[str]] = None,
+        dtypes: Optional[List[Any]] = None,
+        shapes: Optional[List[Tuple[int, ...]]] = None,
+        capacity: int = 1024,
+        ring: bool = False,
+    ):
+        super().__init__(columns, column_names)
+
+        for name, value in [('dtypes', dtypes), ('shapes', shapes)]:
+            if value is not None and len(value) != len(self.column_names):
+                raise ValueError(f'Number of {name} does not match number of columns.')
+
+        if capacity < 1:
+            raise ValueError(f'Invalid value for capacity: {capacity}. Must be a counting number.')
+
+        self.dtypes = dtypes
+        self.shapes = shapes
+        self.capacity = capacity
+        self.ring = ring
+        self._arrays = None
+        self._length = 0
+        self._head = 0
+        self._table = DataBuffer({column_name: np.empty(0) for column_name in self.column_names})
+
+    def _allocate(self, row_data: Tuple[Any]) -> None:
+        rows = 2 * self.capacity if self.ring else self.capacity
+        self._arrays = []
+
+        for i, value in enumerate(row_data):
+            value = np.asarray(value)
+            shape = value.shape if self.shapes is None or self.shapes[i] is None else tuple(self.shapes[i])
+
+            if self.dtypes is not None and self.dtypes[i] is not None:
+                dtype = np.dtype(self.dtypes[i])
+            elif value.dtype.kind in 'iuf':
+                dtype = np.dtype(np.float64)
+            elif value.dtype.kind in 'USO':
+                dtype = np.dtype(object)
+            else:
+                dtype = value.dtype
+
+            self._arrays.append(np.empty((rows,) + shape, dtype=dtype))
+
+    def _check_row(self, row_data: Tuple[Any]) -> None:
+        # checked before any column is written
+        for column_name, array, value in zip(self.column_names, self._arrays, row_data):
+            if array.dtype != object and np.shape(value) != array.shape[1:]:
+                raise RowShapeError(f"Value of shape {np.shape(value)} does not fit column '{column_name}' of shape {array.shape[1:]}.")
+
+    def _grow(self) -> None:
+        self.capacity *= 2
+
+        for i, array in enumerate(self._arrays):
+            grown_array = np.empty((self.capacity,) + array.shape[1:], dtype=array.dtype)
+            grown_array[:self._length] = array[:self._length]
+            self._arrays[i] = grown_array
+
+    def append_row(self, row_data: Tuple[Any]):
+        if len(row_data) != len(self.column_names):
+            raise ValueError("Row data does not match number of columns.")
+
+        if self._arrays is None:
+            self._allocate(row_data)
+        self._check_row(row_data)
+
+        if self.ring:
+            for array, value in zip(self._arrays, row_data):
+                array[self._head] = value
+                array[self._head + self.capacity] = value
+
+            self._head = (self._head + 1) % self.capacity
+            self._length = min(self._length + 1, self.capacity)
+        else:
+            if self._length == self.capacity:
+                self._grow()
+
+            for array, value in zip(self._arrays, row_data):
+                array[self._length] = value
+
+            self._length += 1
+
+        self._table.write(self._arrays)
+
+    def _view(self, i: int) -> np.ndarray:
+        if self._arrays is None:
+            return np.empty(0)
+
+        if not self.ring:
+            end = self._length
+        elif self._length == self.capacity:
+            end = self._head + self.capacity
+        else:
+            end = self._head
+
+        return self._arrays[i][end - self._length:end]
+
+    def get_column(self, column: Union[int, str]) -> np.ndarray:
+        column_name = self._resolve_column_name(column)
+        self._table.read()
+        return self._view(self.column_names.index(column_name))
+
+    def get_all_columns(self, ordered: bool = False) -> Union[Dict[str, np.ndarray], Tuple[np.ndarray]]:
+        self._table.read()
+        columns = tuple(self._view(i) for i in range(len(self.column_names)))
+        if ordered:
+            return columns
+        return dict(zip(self.column_names, columns))
+
+    def __len__(self):
+        return self._length
+
+    def to_pandas(self):
+        columns = self.get_all_columns()
+        return pd.DataFrame({
+            column_name: column if column.ndim == 1 else list(column)
+            for column_name, column in columns.items()
+        }, columns=self.column_names)
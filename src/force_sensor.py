@@ -1,5 +1,6 @@
 from timer import Timer
 from realtime_figure import RealtimeFigureWindow
+from data_management import ColumnarDataStore
 from optoforce import OptoForce22 as OptoForce
 import numpy as np
 from numpy.typing import NDArray
@@ -43,22 +44,20 @@ class OptoForceSensor(ForceSensor):
 
 
 if __name__ == '__main__':
-    figure = RealtimeFigureWindow(refresh_rate=100, subplot_options_set=[
-        {'colors': ['red', 'green', 'blue']}])
+    window = 10.0
+    figure = RealtimeFigureWindow(refresh_rate=30, blit=True, subplot_options_set=[
+        {'colors': ['red', 'green', 'blue'], 'xlim': (-window, 0.0)}])
 
     timer = Timer()
     sensor = OptoForceSensor()
     zero_force = sensor.read()
-    force_axis = []
-    t_axis = []
+    history = ColumnarDataStore(column_names=['t', 'force'], shapes=[(), (3,)], capacity=4096, ring=True)
 
     while True:
         t = timer.t()
         force, torque = sensor.read()
+        history.append_row((t, force))
 
-        t_axis.append(t)
-        force_axis.append(force)
-
-        for options in figure.subplot_options_set:
-            options['xlim'] = (t - 10, t)
-            figure.update([(t_axis, force_axis)])
+        # time relative to now keeps the axes fixed, so only the lines are redrawn
+        if figure.is_due():
+            figure.update([(history.get_column('t') - t, history.get_column('force'))])
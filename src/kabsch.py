@@ -0,0 +1,169 @@
+from __future__ import annotations
+from numpy.typing import NDArray
+import numpy as np
+from typing import Tuple
+
+
+def rotation_from_covariance(H: NDArray) -> NDArray:
+    U, S, Vt = np.linalg.svd(H)
+    R = Vt.T @ U.T
+
+    if np.linalg.det(R) < 0:
+        Vt[-1, :] *= -1
+        R = Vt.T @ U.T
+
+    return R
+
+
+def kabsch(P: NDArray, Q: NDArray) -> Tuple[NDArray, NDArray]:
+    centroid_P = np.mean(P, axis=0)
+    centroid_Q = np.mean(Q, axis=0)
+
+    P_centered = P - centroid_P
+    Q_centered = Q - centroid_Q
+
+    R = rotation_from_covariance(P_centered.T @ Q_centered)
+    t = centroid_Q - R @ centroid_P
+
+    return R, t
+
+
+def trimmed_kabsch(P: NDArray, Q: NDArray, inlier_fraction: float = 0.8, iterations: int = 3) -> Tuple[NDArray, NDArray, NDArray]:
+    inliers = np.ones(len(P), dtype=bool)
+    keep = max(3, int(np.ceil(inlier_fraction * len(P))))
+
+    for _ in range(iterations):
+        R, t = kabsch(P[inliers], Q[inliers])
+        residuals = np.linalg.norm(P @ R.T + t - Q, axis=-1)
+        inliers = np.zeros(len(P), dtype=bool)
+        inliers[np.argsort(residuals)[:keep]] = True
+
+    R, t = kabsch(P[inliers], Q[inliers])
+    return R, t, inliers
+
+
+class OnlineKabsch:
+    '''Streaming rigid fit Q ~ R P + t from running sums, gating pairs against a trimmed refit.'''
+
+    def __init__(self, warmup: int = 20, reservoir_size: int = 200, refit_interval: int = 50, inlier_fraction: float = 0.8, gate: float = 3.0, min_residual: float = 0.005, check_interval: int = 50, seed: int | None = None) -> None:
+        self.warmup = max(warmup, 3)
+        self.check_interval = check_interval
+        self.reservoir_size = reservoir_size
+        self.refit_interval = refit_interval
+        self.inlier_fraction = inlier_fraction
+        self.gate = gate
+        self.min_residual = min_residual
+        self.rng = np.random.default_rng(seed)
+
+        self.reservoir_P = np.empty((reservoir_size, 3))
+        self.reservoir_Q = np.empty((reservoir_size, 3))
+        self.seen = 0
+        self.rejected = 0
+        self.robust_rms = np.inf
+
+        self.count = 0
+        self._sum_P = np.zeros(3)
+        self._sum_Q = np.zeros(3)
+        self._sum_PQ = np.zeros((3, 3))
+        self._sum_squared_norms = 0.0
+
+        self.rotation = np.eye(3)
+        self.translation = np.zeros(3)
+        self.rms = np.inf
+
+        self._checkpoint = None
+        self.translation_change = np.inf
+        self.rotation_change = np.inf
+
+    def _reservoir_sample(self, p: NDArray, q: NDArray) -> None:
+        if self.seen <= self.reservoir_size:
+            i = self.seen - 1
+        else:
+            i = self.rng.integers(self.seen)
+            if i >= self.reservoir_size:
+                return
+
+        self.reservoir_P[i] = p
+        self.reservoir_Q[i] = q
+
+    def _reservoir(self) -> Tuple[NDArray, NDArray]:
+        n = min(self.seen, self.reservoir_size)
+        return self.reservoir_P[:n], self.reservoir_Q[:n]
+
+    def _accumulate(self, p: NDArray, q: NDArray) -> None:
+        self.count += 1
+        self._sum_P += p
+        self._sum_Q += q
+        self._sum_PQ += np.outer(p, q)
+        self._sum_squared_norms += p @ p + q @ q
+
+    def _update_estimate(self) -> None:
+        centroid_P = self._sum_P / self.count
+        centroid_Q = self._sum_Q / self.count
+        H = self._sum_PQ - self.count * np.outer(centroid_P, centroid_Q)
+
+        self.rotation = rotation_from_covariance(H)
+        self.translation = centroid_Q - self.rotation @ centroid_P
+
+        # sum |R p_c - q_c|^2 = sum |p_c|^2 + sum |q_c|^2 - 2 trace(R H)
+        centered_squared_norms = self._sum_squared_norms - self.count * (centroid_P @ centroid_P + centroid_Q @ centroid_Q)
+        self.rms = np.sqrt(max(centered_squared_norms - 2.0 * np.trace(self.rotation @ H), 0.0) / self.count)
+
+        if self.count % self.check_interval == 0:
+            if self._checkpoint is not None:
+                rotation, translation = self._checkpoint
+                self.translation_change = np.linalg.norm(self.translation - translation)
+                cos_angle = (np.trace(self.rotation @ rotation.T) - 1.0) / 2.0
+                self.rotation_change = np.arccos(np.clip(cos_angle, -1.0, 1.0))
+            self._checkpoint = (self.rotation.copy(), self.translation.copy())
+
+    def _refit(self) -> NDArray:
+        P, Q = self._reservoir()
+        R, t, inliers = trimmed_kabsch(P, Q, self.inlier_fraction)
+        residuals = np.linalg.norm(P[inliers] @ R.T + t - Q[inliers], axis=-1)
+        self.robust_rms = np.sqrt(np.mean(residuals ** 2))
+        return inliers
+
+    def add(self, p: NDArray, q: NDArray) -> bool:
+        p = np.asarray(p, dtype=np.float64)
+        q = np.asarray(q, dtype=np.float64)
+
+        self.seen += 1
+        self._reservoir_sample(p, q)
+
+        if self.seen < self.warmup:
+            return True
+
+        if self.seen == self.warmup:
+            P, Q = self._reservoir()
+            for p_i, q_i, inlier in zip(P, Q, self._refit()):
+                if inlier:
+                    self._accumulate(p_i, q_i)
+                else:
+                    self.rejected += 1
+            self._update_estimate()
+            return True
+
+        if self.seen % self.refit_interval == 0:
+            self._refit()
+
+        residual = np.linalg.norm(self.rotation @ p + self.translation - q)
+        if residual > self.gate * max(self.robust_rms, self.min_residual):
+            self.rejected += 1
+            return False
+
+        self._accumulate(p, q)
+        self._update_estimate()
+        return True
+
+    def has_estimate(self) -> bool:
+        return self.count >= 3
+
+    def has_converged(self, translation_tolerance: float = 0.001, rotation_tolerance: float = 0.002, min_pairs: int = 100) -> bool:
+        return self.count >= min_pairs and self.translation_change < translation_tolerance and self.rotation_change < rotation_tolerance
+
+    def matrix(self) -> NDArray:
+        matrix = np.eye(4)
+        matrix[0:3, 0:3] = self.rotation
+        matrix[0:3, 3] = self.translation
+        return matrix
@@ -0,0 +1,115 @@
+from __future__ import annotations
+from rgbd_stream import RGBDFrame
+from numpy.typing import NDArray
+import numpy as np
+from typing import Tuple
+import cv2
+
+
+class MarkerTracker:
+    '''Tracks a coloured marker in a window around its last detection, falling back to a coarse full frame search.'''
+
+    def __init__(self, marker_color: NDArray, threshold: float = 0.03, roi_radius: int = 24, coarse_stride: int = 4, min_weight: float = 1.0) -> None:
+        self.marker_color = np.asarray(marker_color, dtype=np.float32)
+        self.threshold = threshold
+        self.roi_radius = roi_radius
+        self.coarse_stride = coarse_stride
+        self.min_weight = min_weight
+        self.mask = None
+        self.reset()
+
+    def reset(self) -> None:
+        self.pixel = None
+        self.confidence = 0.0
+        self._roi = None
+
+    def _color_weights(self, rgb: NDArray) -> NDArray:
+        difference = rgb - self.marker_color
+        distance = np.einsum('...i,...i->...', difference, difference)
+        return np.maximum(1.0 - distance / self.threshold, 0.0)
+
+    def _sample_rgb(self, frame: RGBDFrame, rows: NDArray, columns: NDArray) -> NDArray:
+        # the depth resolution rgb at only these pixels, interpolated as cv2.resize would for the whole image
+        if 'resized_rgb' in frame.__dict__:
+            return frame.resized_rgb[np.ix_(rows, columns)]
+
+        scale_y = frame.rgb.shape[0] / frame.depth.shape[0]
+        scale_x = frame.rgb.shape[1] / frame.depth.shape[1]
+        map_x, map_y = np.meshgrid(
+            ((columns + 0.5) * scale_x - 0.5).astype(np.float32), ((rows + 0.5) * scale_y - 0.5).astype(np.float32))
+        return cv2.remap(frame.rgb, map_x, map_y, cv2.INTER_LINEAR, borderMode=cv2.BORDER_REPLICATE)
+
+    def _coarse_search(self, frame: RGBDFrame) -> Tuple[int, int] | None:
+        stride = self.coarse_stride
+        height, width = frame.depth.shape
+        weights = self._color_weights(self._sample_rgb(frame, np.arange(0, height, stride), np.arange(0, width, stride)))
+        indices_y, indices_x = np.nonzero(weights)
+
+        if len(indices_x) == 0:
+            return None
+
+        return int(np.median(indices_x)) * stride, int(np.median(indices_y)) * stride
+
+    def _get_roi(self, center: Tuple[float, float], height: int, width: int) -> Tuple[slice, slice]:
+        x, y = int(center[0]), int(center[1])
+        return (slice(max(y - self.roi_radius, 0), min(y + self.roi_radius + 1, height)),
+                slice(max(x - self.roi_radius, 0), min(x + self.roi_radius + 1, width)))
+
+    def _fine_search(self, frame: RGBDFrame, roi: Tuple[slice, slice]) -> Tuple[NDArray, NDArray] | None:
+        rows, columns = np.arange(roi[0].start, roi[0].stop), np.arange(roi[1].start, roi[1].stop)
+        weights = self._color_weights(self._sample_rgb(frame, rows, columns))
+        weights *= (1.0 + frame.confidence[roi]) / 3.0
+
+        total_weight = np.sum(weights)
+        if total_weight < self.min_weight:
+            return None
+
+        # screen coordinates of the window's pixel centres, as in frame.xyz, without building them for the frame
+        x = (columns + 0.5).astype(frame.dtype)[None, :]
+        y = (rows + 0.5).astype(frame.dtype)[:, None]
+        z = frame.depth[roi].astype(frame.dtype)
+
+        if frame.camera.intrinsics.orthographic:
+            centroid = np.array([np.sum(weights * x), np.sum(weights * y), np.sum(weights * z)]) / total_weight
+        else:
+            # the weighted mean of perspective back-projected points is the back-projection of the depth weighted
+            # screen centroid at the mean depth, so a single point needs to be unprojected
+            depth_weights = weights * z
+            total_depth_weight = np.sum(depth_weights)
+            centroid = np.array([
+                np.sum(depth_weights * x) / total_depth_weight,
+                np.sum(depth_weights * y) / total_depth_weight,
+                total_depth_weight / total_weight])
+
+        self.confidence = float(total_weight)
+        self.pixel = centroid[0:2]
+        return centroid, weights
+
+    def find(self, frame: RGBDFrame) -> Tuple[NDArray | None, NDArray]:
+        height, width = frame.depth.shape
+
+        if self.mask is None or self.mask.shape != (height, width):
+            self.mask = np.zeros((height, width), dtype=bool)
+        elif self._roi is not None:
+            self.mask[self._roi] = False
+
+        result = None
+        if self.pixel is not None:
+            self._roi = self._get_roi(self.pixel, height, width)
+            result = self._fine_search(frame, self._roi)
+
+        if result is None:
+            center = self._coarse_search(frame)
+            if center is not None:
+                self._roi = self._get_roi(center, height, width)
+                result = self._fine_search(frame, self._roi)
+
+        if result is None:
+            self.reset()
+            return None, self.mask
+
+        centroid, weights = result
+        self.mask[self._roi] = weights > 0.0
+
+        marker_position = frame.camera.screen_to_world(centroid, width=width, height=height)
+        return marker_position, self.mask
@@ -1,5 +1,108 @@
 import torch.nn as nn
+import argparse
+import importlib
+import json
 import os
+import subprocess
+import sys
+import threading
+import torch
+
+# Optional backends, imported by the encoders that use them when they are first constructed or loaded
+BACKENDS = {
+    'gensim': 'gensim.models',
+    'tensorflow_hub': 'tensorflow_hub',
+    'sentence_transformers': 'sentence_transformers',
+}
+
+# Seconds that importing this module may add on top of importing torch
+IMPORT_TIME_BUDGET = 0.05
+
+ENCODERS = {}
+DECODERS = {}
+
+_model_pool = {}
+_model_pool_lock = threading.Lock()
+
+
+def import_backend(backend):
+    return importlib.import_module(BACKENDS[backend])
+
+
+def register_encoder(name):
+    """
+    Class decorator registering an encoder under name, for create_encoder.
+    """
+    def register(encoder_class):
+        encoder_class.encoder_name = name
+        ENCODERS[name] = encoder_class
+        return encoder_class
+    return register
+
+
+def register_decoder(name):
+    """
+    Class decorator registering a decoder under name, for loading saved decoders.
+    """
+    def register(decoder_class):
+        decoder_class.decoder_name = name
+        DECODERS[name] = decoder_class
+        return decoder_class
+    return register
+
+
+def _load_registered(load_path, registry, kind):
+    # memory-mapped, so that only the name is read from large checkpoints before the class loads them
+    name = torch.load(load_path, mmap=True).get(kind)
+    if name not in registry:
+        raise ValueError(f"{load_path} does not name a registered phrase embedding {kind} ({name}). Registered: {', '.join(registry)}")
+    return registry[name].load(load_path)
+
+
+def create_encoder(name, *args, **kwargs):
+    if name not in ENCODERS:
+        raise ValueError(f"Unknown phrase embedding encoder: {name}. Registered encoders: {', '.join(ENCODERS)}")
+    return ENCODERS[name](*args, **kwargs)
+
+
+def get_pooled_model(backend, model_name, load_model):
+    """
+    Returns the process-wide instance of a backend model, loading it on first use.
+    """
+    key = (backend, model_name)
+    with _model_pool_lock:
+        model = _model_pool.get(key)
+        if model is None:
+            model = _model_pool[key] = load_model(model_name)
+    return model
+
+
+def release_pooled_models():
+    """
+    Drops the pool's references to the shared models, which are freed once no encoder uses them.
+    """
+    with _model_pool_lock:
+        _model_pool.clear()
+
+
+def measure_import_time():
+    """
+    Imports this module in a fresh interpreter after torch, returning the seconds it took and the optional
+    backends it imported.
+    """
+    code = (
+        'import json, sys, time, torch\n'
+        't = time.perf_counter()\n'
+        'import phrase_embedding\n'
+        'elapsed = time.perf_counter() - t\n'
+        'print(json.dumps([elapsed, [b for b, m in phrase_embedding.BACKENDS.items() if m in sys.modules]]))\n'
+    )
+    output = subprocess.run(
+        [sys.executable, '-c', code], cwd=os.path.dirname(os.path.abspath(__file__)),
+        check=True, capture_output=True, text=True).stdout
+    elapsed, backends = json.loads(output.splitlines()[-1])
+    return elapsed, backends
+
     
 class PhraseEmbeddingEncoder(nn.Module):
     def forward(self, phrase_texts):
@@ -16,13 +119,19 @@ class PhraseEmbeddingEncoder(nn.Module):
         """
         raise NotImplementedError("Subclasses must implement the save method.")
 
+    def _use_pooled_model(self, model):
+        """
+        Stores a pooled model without registering it as a submodule of this encoder.
+        """
+        object.__setattr__(self, 'model', model)
+
     @staticmethod
     def load(load_path):
         """
-        Loads the encoder state from a file.
-        Subclasses should implement this method.
+        Loads an encoder saved by any registered encoder class, which subclasses record in their checkpoint
+        under 'encoder'. Subclasses implement this method for their own checkpoints.
         """
-        raise NotImplementedError("Subclasses must implement the load method.")
+        return _load_registered(load_path, ENCODERS, 'encoder')
 
 
 class PhraseEmbeddingDecoder(nn.Module):
@@ -43,10 +152,10 @@ class PhraseEmbeddingDecoder(nn.Module):
     @staticmethod
     def load(load_path):
         """
-        Loads the decoder state from a file.
-        Subclasses should implement this method.
+        Loads a decoder saved by any registered decoder class, which subclasses record in their checkpoint
+        under 'decoder'. Subclasses implement this method for their own checkpoints.
         """
-        raise NotImplementedError("Subclasses must implement the load method.")
+        return _load_registered(load_path, DECODERS, 'decoder')
 
 class PhraseEmbeddingModel(nn.Module):
     def __init__(self, phrase_encoder: PhraseEmbeddingEncoder, phrase_decoder: PhraseEmbeddingDecoder):
@@ -61,8 +170,8 @@ class PhraseEmbeddingModel(nn.Module):
         return self.phrase_decoder(phrase_embedding)
     
     def forward(self, phrase_texts):
-        phrase_embeddings = self.encoder(phrase_texts)
-        return self.decoder(phrase_embeddings)
+        phrase_embeddings = self.phrase_encoder(phrase_texts)
+        return self.phrase_decoder(phrase_embeddings)
     
     def save(self, save_dir_path):
         os.makedirs(save_dir_path, exist_ok=True)
@@ -88,14 +197,169 @@ class PhraseEmbeddingModel(nn.Module):
         
         return PhraseEmbeddingModel(phrase_encoder, phrase_decoder)
     
-from gensim.models import KeyedVectors
+from collections import OrderedDict
+from column_stream import COLUMN_FILE_EXTENSION, read_header, write_header
+import hashlib
+import numpy as np
 import torch
 import torch.nn as nn
+import torch.nn.functional as F
 import os
 
+WORD_VECTORS_COLUMN = 'vectors'
+VOCABULARY_FILE_NAME = 'vocabulary.txt'
+READ_CHUNK_SIZE = 1 << 20
+
+
+def phrase_vocabulary(phrase_texts):
+    """
+    The distinct words of the phrases.
+    """
+    return sorted({word for phrase in phrase_texts for word in phrase.split()})
+
+
+def _read_word2vec_binary_rows(file, count, dim):
+    row_nbytes = dim * np.dtype(np.float32).itemsize
+    buffer = b''
+    position = 0
+    for _ in range(count):
+        while True:
+            separator = buffer.find(b' ', position)
+            if separator >= 0 and len(buffer) - separator - 1 >= row_nbytes:
+                break
+            chunk = file.read(max(READ_CHUNK_SIZE, row_nbytes))
+            if not chunk:
+                break
+            buffer = buffer[position:] + chunk
+            position = 0
+
+        if separator < 0 or len(buffer) - separator - 1 < row_nbytes:
+            raise ValueError(f"Truncated word2vec file: expected {count} vectors of size {dim}.")
+        # records may be separated by a newline, which is not part of the next word
+        word = buffer[position:separator].replace(b'\n', b'')
+        vector = np.frombuffer(buffer[separator + 1:separator + 1 + row_nbytes], dtype='<f4')
+        position = separator + 1 + row_nbytes
+        yield word, vector
+
+
+def _read_word2vec_text_rows(file, count, dim):
+    for _ in range(count):
+        parts = file.readline().split()
+        yield parts[0], np.array(parts[1:], dtype=np.float32)
+
+
+def _read_word2vec_rows(file, count, dim, binary):
+    rows = _read_word2vec_binary_rows(file, count, dim) if binary else _read_word2vec_text_rows(file, count, dim)
+    for word, vector in rows:
+        if len(vector) != dim:
+            raise ValueError(f"Truncated word2vec file: expected {count} vectors of size {dim}.")
+        yield word.decode('utf-8', errors='replace'), vector
+
+
+def convert_word2vec(model_path, output_dir, binary=False, vocabulary=None, dtype=np.float16):
+    """
+    Converts a word2vec text or binary file into a vocabulary file and a memory-mappable vectors column.
+    Returns the vocabulary words the file does not contain.
+    """
+    wanted = None if vocabulary is None else set(vocabulary)
+    words = []
+    found = set()
+    os.makedirs(output_dir, exist_ok=True)
+
+    with open(model_path, 'rb') as file, open(os.path.join(output_dir, WORD_VECTORS_COLUMN + COLUMN_FILE_EXTENSION), 'wb') as vectors_file:
+        count, dim = map(int, file.readline().split())
+
+        for word, vector in _read_word2vec_rows(file, count, dim, binary):
+            if word in found or (wanted is not None and word not in wanted):
+                continue
+            found.add(word)
+            words.append(word)
+            vectors_file.write(vector.astype(dtype).tobytes())
 
+            if wanted is not None and len(found) == len(wanted):
+                break
+
+    if not words:
+        raise ValueError(f"None of the vocabulary words were found in {model_path}")
+
+    with open(os.path.join(output_dir, VOCABULARY_FILE_NAME), 'w', encoding='utf-8') as file:
+        file.write('\n'.join(words))
+
+    # written last, so an interrupted conversion is not mistaken for a complete one
+    write_header(output_dir, {WORD_VECTORS_COLUMN: (dtype, (dim,))})
+    return [] if wanted is None else sorted(wanted - found)
+
+
+def read_word_vectors(vectors_dir):
+    """
+    Reads the words and the copy-on-write memory-mapped vectors written by convert_word2vec.
+    """
+    dtype, shape = read_header(vectors_dir)[WORD_VECTORS_COLUMN]
+    with open(os.path.join(vectors_dir, VOCABULARY_FILE_NAME), 'r', encoding='utf-8') as file:
+        words = file.read().split('\n')
+    vectors = np.memmap(os.path.join(vectors_dir, WORD_VECTORS_COLUMN + COLUMN_FILE_EXTENSION), dtype=dtype, mode='c', shape=(len(words),) + shape)
+    return words, vectors
+
+
+class PhraseEmbeddingCache:
+    """
+    LRU cache of phrase embeddings, persisted per model fingerprint.
+    """
+    def __init__(self, fingerprint, capacity=65536, cache_path=None):
+        self.fingerprint = fingerprint
+        self.capacity = capacity
+        self.cache_path = cache_path
+        self.embeddings = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+        if cache_path is not None and os.path.exists(cache_path):
+            self.load()
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def get(self, phrase):
+        embedding = self.embeddings.get(phrase)
+        if embedding is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        self.embeddings.move_to_end(phrase)
+        return embedding
+
+    def put(self, phrase, embedding):
+        # a row of a batch is a view that would keep the whole batch alive, so the cache holds its own copy
+        self.embeddings[phrase] = embedding.detach().clone()
+        self.embeddings.move_to_end(phrase)
+        while len(self.embeddings) > self.capacity:
+            self.embeddings.popitem(last=False)
+
+    def clear(self):
+        self.embeddings.clear()
+
+    def save(self):
+        phrases = list(self.embeddings.keys())
+        embeddings = torch.stack(list(self.embeddings.values())) if phrases else torch.empty(0)
+        temporary_path = self.cache_path + '.tmp'
+        torch.save({'fingerprint': self.fingerprint, 'phrases': phrases, 'embeddings': embeddings}, temporary_path)
+        os.replace(temporary_path, self.cache_path)
+
+    def load(self):
+        checkpoint = torch.load(self.cache_path)
+        if checkpoint['fingerprint'] != self.fingerprint:
+            return
+        # the most recently used phrases were saved last, so they are kept if the capacity shrank
+        phrases = checkpoint['phrases'][-self.capacity:]
+        embeddings = checkpoint['embeddings'][len(checkpoint['phrases']) - len(phrases):]
+        self.embeddings = OrderedDict(zip(phrases, (embedding.clone() for embedding in embeddings)))
+
+
+@register_encoder('word2vec_averager')
 class Word2VecAveragerPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
-    def __init__(self, word2idx, weights, embedding_dim, fine_tunable=False):
+    FINGERPRINT_SAMPLE_ROWS = 1024
+
+    def __init__(self, word2idx, weights, embedding_dim, fine_tunable=False, cache_size=0, cache_path=None):
         super().__init__()
         self.fine_tunable = fine_tunable
         self.word2idx = word2idx
@@ -104,12 +368,31 @@ class Word2VecAveragerPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
         # Create the embedding layer
         self.embedding = nn.Embedding.from_pretrained(weights, freeze=not fine_tunable)
 
-    def forward(self, phrase_texts):
+        # Fine-tuning changes the embeddings, so only frozen encoders cache them
+        self.cache = None
+        if cache_size > 0 and not fine_tunable:
+            self.cache = PhraseEmbeddingCache(self.fingerprint(), cache_size, cache_path)
+
+    def fingerprint(self):
         """
-        Encode a list of phrases into embeddings by averaging word embeddings.
+        Hash of the vocabulary and of a sample of the embedding rows.
         """
-        embeddings = []
+        weights = self.embedding.weight.detach()
+        step = max(1, len(weights) // self.FINGERPRINT_SAMPLE_ROWS)
+        digest = hashlib.sha1()
+        digest.update(f'{self.embedding_dim}:{len(self.word2idx)}'.encode())
+        digest.update('\n'.join(sorted(self.word2idx, key=self.word2idx.get)).encode())
+        digest.update(np.ascontiguousarray(weights[::step].cpu().numpy()).tobytes())
+        return digest.hexdigest()
+
+    def tokenize(self, phrase_texts):
+        """
+        Flattens the word indices of all phrases into one tensor, with the offset at which each phrase starts.
+        """
+        indices = []
+        offsets = []
         for phrase in phrase_texts:
+            offsets.append(len(indices))
             word_indices = [
                 self.word2idx[word]
                 for word in phrase.split()
@@ -117,16 +400,51 @@ class Word2VecAveragerPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
             ]
             if not word_indices:
                 raise ValueError(f"No valid words found in the phrase: {phrase}")
-            word_embeddings = self.embedding(torch.tensor(word_indices))
-            phrase_embedding = word_embeddings.mean(dim=0)
-            embeddings.append(phrase_embedding)
+            indices.extend(word_indices)
+
+        device = self.embedding.weight.device
+        return torch.tensor(indices, device=device), torch.tensor(offsets, device=device)
+
+    def encode_uncached(self, phrase_texts):
+        """
+        Averages the word embeddings of all phrases with a single mean-mode bag lookup.
+        """
+        indices, offsets = self.tokenize(phrase_texts)
+        # float16 word vectors are averaged in float16 and returned as float32
+        return F.embedding_bag(indices, self.embedding.weight, offsets, mode='mean').float()
+
+    def forward(self, phrase_texts):
+        """
+        Encode a list of phrases into embeddings by averaging word embeddings.
+        """
+        if self.cache is None:
+            return self.encode_uncached(phrase_texts)
+
+        embeddings = [self.cache.get(phrase) for phrase in phrase_texts]
+        missing = list(dict.fromkeys(phrase for phrase, embedding in zip(phrase_texts, embeddings) if embedding is None))
+
+        if missing:
+            with torch.no_grad():
+                computed = dict(zip(missing, self.encode_uncached(missing)))
+            for phrase, embedding in computed.items():
+                self.cache.put(phrase, embedding)
+            embeddings = [computed[phrase] if embedding is None else embedding for phrase, embedding in zip(phrase_texts, embeddings)]
+
         return torch.stack(embeddings)
 
+    def save_cache(self):
+        """
+        Persist the phrase embedding cache to its cache_path.
+        """
+        if self.cache is not None and self.cache.cache_path is not None:
+            self.cache.save()
+
     def save(self, save_path):
         """
         Save the encoder state.
         """
         torch.save({
+            'encoder': self.encoder_name,
             'word2idx': self.word2idx,
             'embedding_state_dict': self.embedding.state_dict(),
             'embedding_dim': self.embedding_dim,
@@ -134,7 +452,7 @@ class Word2VecAveragerPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
         }, save_path)
 
     @staticmethod
-    def load(load_path):
+    def load(load_path, cache_size=0, cache_path=None):
         """
         Load the encoder state.
         """
@@ -143,40 +461,55 @@ class Word2VecAveragerPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
         embedding_dim = checkpoint['embedding_dim']
         fine_tunable = checkpoint['fine_tunable']
 
-        # Create the embedding layer
+        # The cache is created once the loaded weights are in place, as they determine its fingerprint
         weights = torch.zeros(len(word2idx), embedding_dim)
-        encoder = Word2VecPhraseEmbeddingEncoder(word2idx, weights, embedding_dim, fine_tunable)
+        encoder = Word2VecAveragerPhraseEmbeddingEncoder(word2idx, weights, embedding_dim, fine_tunable)
         encoder.embedding.load_state_dict(checkpoint['embedding_state_dict'])
+        if cache_size > 0 and not fine_tunable:
+            encoder.cache = PhraseEmbeddingCache(encoder.fingerprint(), cache_size, cache_path)
         return encoder
     
     @staticmethod
-    def from_pretrained_gensim_keyed_vectors(keyed_vectors, fine_tunable=False):
+    def from_pretrained_gensim_keyed_vectors(keyed_vectors, fine_tunable=False, cache_size=0, cache_path=None):
         """
         Initialize from a Gensim KeyedVectors object.
         """
         word2idx = {word: i for i, word in enumerate(keyed_vectors.index_to_key)}
         weights = torch.tensor(keyed_vectors.vectors, dtype=torch.float32)
         embedding_dim = keyed_vectors.vector_size
-        return Word2VecPhraseEmbeddingEncoder(word2idx, weights, embedding_dim, fine_tunable)
+        return Word2VecAveragerPhraseEmbeddingEncoder(word2idx, weights, embedding_dim, fine_tunable, cache_size, cache_path)
     
     @staticmethod
-    def load_from_pretrained_gensim_keyed_vectors(model_path, binary=False, fine_tunable=False):
+    def load_from_pretrained_gensim_keyed_vectors(model_path, binary=False, fine_tunable=False, cache_size=0, cache_path=None):
         """
         Load from a Gensim KeyedVectors file.
         """
-        keyed_vectors = KeyedVectors.load_word2vec_format(model_path, binary=binary)
-        return Word2VecPhraseEmbeddingEncoder.from_pretrained_gensim_keyed_vectors(keyed_vectors)
+        keyed_vectors = import_backend('gensim').KeyedVectors.load_word2vec_format(model_path, binary=binary)
+        return Word2VecAveragerPhraseEmbeddingEncoder.from_pretrained_gensim_keyed_vectors(keyed_vectors, fine_tunable, cache_size, cache_path)
+
+    @staticmethod
+    def load_word_vectors(vectors_dir, fine_tunable=False, cache_size=0, cache_path=None):
+        """
+        Load from word vectors converted by convert_word2vec.
+        """
+        words, vectors = read_word_vectors(vectors_dir)
+        word2idx = {word: i for i, word in enumerate(words)}
+        weights = torch.from_numpy(vectors)
+        if fine_tunable:
+            weights = weights.float()
+        return Word2VecAveragerPhraseEmbeddingEncoder(word2idx, weights, vectors.shape[1], fine_tunable, cache_size, cache_path)
     
-import tensorflow_hub as hub
 import torch
 import torch.nn as nn
 import numpy as np
 
+@register_encoder('universal_sentence_encoder')
 class UniversalSentenceEncoder(PhraseEmbeddingEncoder):
     def __init__(self, model_url="https://tfhub.dev/google/universal-sentence-encoder/4", fine_tunable=False):
         super().__init__()
         self.fine_tunable = fine_tunable
-        self.model = hub.load(model_url)
+        self.model_url = model_url
+        self._use_pooled_model(get_pooled_model('tensorflow_hub', model_url, import_backend('tensorflow_hub').load))
         
         # Since USE embeddings are not fine-tunable by default, warn if fine-tunable is requested
         if fine_tunable:
@@ -193,7 +526,8 @@ class UniversalSentenceEncoder(PhraseEmbeddingEncoder):
         """
         Save the state of the encoder.
         """
-        torch.save({'model_url': "https://tfhub.dev/google/universal-sentence-encoder/4",
+        torch.save({'encoder': self.encoder_name,
+                    'model_url': self.model_url,
                     'fine_tunable': self.fine_tunable}, save_path)
 
     @staticmethod
@@ -207,27 +541,102 @@ class UniversalSentenceEncoder(PhraseEmbeddingEncoder):
             fine_tunable=checkpoint['fine_tunable']
         )
     
-from sentence_transformers import SentenceTransformer
+import time
 import torch
 
+
+_inference_threads = None
+
+
+def set_inference_threads(num_threads):
+    """
+    Sets torch's process-wide intra-op thread count; call once at process setup.
+    """
+    global _inference_threads
+    if _inference_threads is not None and _inference_threads != num_threads:
+        print(f"Warning: changing torch's process-wide thread count from {_inference_threads} to {num_threads}")
+    _inference_threads = num_threads
+    torch.set_num_threads(num_threads)
+
+
+def quantize_linear_layers(model):
+    """
+    Copy of the model with its linear layers dynamically quantized to int8, for CPU inference.
+    """
+    return torch.ao.quantization.quantize_dynamic(model, {nn.Linear}, dtype=torch.qint8, inplace=False)
+
+
+@register_encoder('sbert')
 class SBERTPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
-    def __init__(self, model_name='all-MiniLM-L6-v2', fine_tunable=False):
+    """
+    num_threads sets the process-wide thread count through set_inference_threads.
+    """
+
+    def __init__(self, model_name='all-MiniLM-L6-v2', fine_tunable=False, quantized=False, num_threads=None, batch_size=32):
         super().__init__()
+        if fine_tunable and quantized:
+            raise ValueError("A quantized SBERT encoder cannot be fine-tuned.")
+
         self.fine_tunable = fine_tunable
         self.model_name = model_name
+        self.quantized = quantized
+        self.num_threads = num_threads
+        self.batch_size = batch_size
 
-        # Load SBERT model
-        self.model = SentenceTransformer(model_name)
+        if num_threads is not None:
+            set_inference_threads(num_threads)
+
+        # Load SBERT model, shared with other frozen encoders of the same model; fine-tuned ones need their own copy
+        SentenceTransformer = import_backend('sentence_transformers').SentenceTransformer
+        if fine_tunable:
+            self.model = SentenceTransformer(model_name)
+        elif quantized:
+            self._use_pooled_model(get_pooled_model(
+                'sentence_transformers', f'{model_name}:int8',
+                lambda _: quantize_linear_layers(SentenceTransformer(model_name, device='cpu').eval())))
+        else:
+            self._use_pooled_model(get_pooled_model('sentence_transformers', model_name, SentenceTransformer))
 
         # Configure fine-tuning
         if fine_tunable:
             for param in self.model.parameters():
                 param.requires_grad = True
 
+    def is_cpu_inference(self):
+        return self.quantized or self.num_threads is not None
+
+    def _encode_micro_batches(self, phrase_texts):
+        """
+        Encodes phrases in length-sorted micro-batches, returned in the original order.
+        """
+        order = sorted(range(len(phrase_texts)), key=lambda i: len(phrase_texts[i]))
+        embeddings = [None] * len(phrase_texts)
+        batch_to_device = import_backend('sentence_transformers').util.batch_to_device
+        # newer sentence-transformers versions renamed tokenize to preprocess
+        preprocess = getattr(self.model, 'preprocess', None) or self.model.tokenize
+
+        # the forward pass is called directly, so dropout is disabled here as encode() would
+        training = self.model.training
+        self.model.eval()
+        try:
+            with torch.inference_mode():
+                for start in range(0, len(order), self.batch_size):
+                    batch_indices = order[start:start + self.batch_size]
+                    features = batch_to_device(preprocess([phrase_texts[i] for i in batch_indices]), self.model.device)
+                    batch_embeddings = self.model(features)['sentence_embedding']
+                    for i, embedding in zip(batch_indices, batch_embeddings):
+                        embeddings[i] = embedding
+        finally:
+            self.model.train(training)
+
+        return torch.stack(embeddings)
+
     def forward(self, phrase_texts):
         """
         Encodes a list of phrases into embeddings using SBERT.
         """
+        if self.is_cpu_inference():
+            return self._encode_micro_batches(phrase_texts)
         embeddings = self.model.encode(phrase_texts, convert_to_tensor=True)
         return embeddings
 
@@ -236,8 +645,12 @@ class SBERTPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
         Save the state of the encoder.
         """
         torch.save({
+            'encoder': self.encoder_name,
             'model_name': self.model_name,
             'fine_tunable': self.fine_tunable,
+            'quantized': self.quantized,
+            'num_threads': self.num_threads,
+            'batch_size': self.batch_size,
             'model_state_dict': self.model.state_dict() if self.fine_tunable else None
         }, save_path)
 
@@ -249,8 +662,251 @@ class SBERTPhraseEmbeddingEncoder(PhraseEmbeddingEncoder):
         checkpoint = torch.load(load_path)
         encoder = SBERTPhraseEmbeddingEncoder(
             model_name=checkpoint['model_name'],
-            fine_tunable=checkpoint['fine_tunable']
+            fine_tunable=checkpoint['fine_tunable'],
+            quantized=checkpoint.get('quantized', False),
+            num_threads=checkpoint.get('num_threads'),
+            batch_size=checkpoint.get('batch_size', 32),
         )
         if checkpoint['fine_tunable']:
             encoder.model.load_state_dict(checkpoint['model_state_dict'])
-        return encoder
\ No newline at end of file
+        return encoder
+
+
+def _nearest_centroids(embeddings, centroids, count):
+    # argmin |x - c|^2 = argmax x.c - |c|^2 / 2
+    scores = embeddings @ centroids.T - 0.5 * (centroids * centroids).sum(dim=1)
+    return scores.topk(count, dim=1).indices
+
+
+def _kmeans(embeddings, n_lists, iterations, generator):
+    centroids = embeddings[torch.randperm(len(embeddings), generator=generator)[:n_lists]].clone()
+    for _ in range(iterations):
+        assignments = _nearest_centroids(embeddings, centroids, 1)[:, 0]
+        sums = torch.zeros_like(centroids).index_add_(0, assignments, embeddings)
+        counts = torch.bincount(assignments, minlength=len(centroids))
+        is_used = counts > 0
+        centroids[is_used] = sums[is_used] / counts[is_used, None].to(sums.dtype)
+    return centroids
+
+
+@register_decoder('nearest_phrase')
+class NearestPhraseDecoder(PhraseEmbeddingDecoder):
+    """
+    Decodes embeddings to the nearest candidate phrases, exactly or through an inverted file index.
+    """
+    METRICS = ('cosine', 'dot')
+
+    def __init__(self, phrases, embeddings, metric='cosine', approximate=False, n_lists=None, n_probe=8,
+                 kmeans_iterations=10, seed=0, centroids=None):
+        super().__init__()
+        if metric not in self.METRICS:
+            raise ValueError(f"Unknown metric: {metric}. Supported metrics: {', '.join(self.METRICS)}")
+        if len(phrases) != len(embeddings):
+            raise ValueError(f"Got {len(phrases)} phrases but {len(embeddings)} embeddings.")
+
+        self.phrases = list(phrases)
+        self.metric = metric
+        self.approximate = approximate
+        self.n_probe = n_probe
+
+        embeddings = torch.as_tensor(embeddings, dtype=torch.float32).detach()
+        if metric == 'cosine':
+            embeddings = F.normalize(embeddings, dim=1)
+        self.register_buffer('embeddings', embeddings)
+
+        if not approximate:
+            return
+
+        if centroids is None:
+            n_lists = n_lists or max(1, int(np.sqrt(len(embeddings))))
+            generator = torch.Generator().manual_seed(seed)
+            # as in common IVF implementations, the lists are trained on a bounded sample of the corpus
+            sample = embeddings[torch.randperm(len(embeddings), generator=generator)[:256 * n_lists]]
+            centroids = _kmeans(sample, n_lists, kmeans_iterations, generator)
+
+        assignments = _nearest_centroids(embeddings, centroids, 1)[:, 0]
+        counts = torch.bincount(assignments, minlength=len(centroids))
+
+        # empty lists are dropped so that every probed list contributes candidates, and the embeddings are
+        # stored grouped by list, so that scoring a list reads one contiguous block
+        is_used = counts > 0
+        remap = torch.cumsum(is_used, dim=0) - 1
+        phrase_ids = torch.argsort(remap[assignments], stable=True)
+        self.embeddings = embeddings[phrase_ids]
+        self.register_buffer('phrase_ids', phrase_ids)
+        self.register_buffer('centroids', centroids[is_used].clone())
+        offsets = torch.cumsum(counts[is_used], dim=0)
+        self.list_bounds = list(zip([0] + offsets[:-1].tolist(), offsets.tolist()))
+
+    def __len__(self):
+        return len(self.phrases)
+
+    @staticmethod
+    def from_encoder(encoder, phrases, batch_size=4096, **kwargs):
+        """
+        Builds the index over phrases, encoded in batches with the given phrase encoder.
+        """
+        with torch.no_grad():
+            embeddings = torch.cat([
+                encoder(phrases[i:i + batch_size]).float().cpu()
+                for i in range(0, len(phrases), batch_size)
+            ])
+        return NearestPhraseDecoder(phrases, embeddings, **kwargs)
+
+    def _queries(self, phrase_embeddings):
+        queries = torch.as_tensor(phrase_embeddings).detach().to(self.embeddings.device, torch.float32)
+        queries = queries.reshape(-1, self.embeddings.shape[1])
+        return F.normalize(queries, dim=1) if self.metric == 'cosine' else queries
+
+    def _search_exact(self, queries, k):
+        top = (queries @ self.embeddings.T).topk(min(k, len(self.embeddings)), dim=1)
+        return top.values, top.indices
+
+    def _search_probed_lists(self, query, lists, k):
+        bounds = [self.list_bounds[list_index] for list_index in lists]
+        candidates = torch.cat([self.embeddings[start:stop] for start, stop in bounds])
+        rows = torch.cat([torch.arange(start, stop, device=query.device) for start, stop in bounds])
+        top = (candidates @ query).topk(min(k, len(rows)))
+        padding = (0, k - len(top.values))
+        return F.pad(top.values, padding, value=-torch.inf)[None], F.pad(self.phrase_ids[rows[top.indices]], padding, value=-1)[None]
+
+    def _search_approximate(self, queries, k):
+        probe = _nearest_centroids(queries, self.centroids, min(self.n_probe, len(self.centroids)))
+        if len(queries) == 1:
+            # a single query, e.g. once per control tick, scores its probed lists as one block
+            return self._search_probed_lists(queries[0], probe[0].tolist(), k)
+
+        top_scores = torch.full((len(queries), k), -torch.inf, device=queries.device)
+        top_rows = torch.full((len(queries), k), -1, dtype=torch.long, device=queries.device)
+
+        # each probed list is scored with one matrix product against all queries probing it and merged into
+        # their running top k
+        for list_index in torch.unique(probe).tolist():
+            query_indices = (probe == list_index).any(dim=1).nonzero()[:, 0]
+            start, stop = self.list_bounds[list_index]
+            scores = torch.cat([top_scores[query_indices], queries[query_indices] @ self.embeddings[start:stop].T], dim=1)
+            rows = torch.arange(start, stop, device=queries.device).expand(len(query_indices), -1)
+            rows = torch.cat([top_rows[query_indices], rows], dim=1)
+            top = scores.topk(k, dim=1)
+            top_scores[query_indices] = top.values
+            top_rows[query_indices] = torch.gather(rows, 1, top.indices)
+
+        ids = torch.where(top_rows >= 0, self.phrase_ids[top_rows.clamp(min=0)], -1)
+        return top_scores, ids
+
+    def search(self, phrase_embeddings, k=1):
+        """
+        Returns the similarities and indices of the k nearest phrases of each embedding, best first.
+        """
+        queries = self._queries(phrase_embeddings)
+        with torch.no_grad():
+            return self._search_approximate(queries, k) if self.approximate else self._search_exact(queries, k)
+
+    def decode_top_k(self, phrase_embeddings, k):
+        _, indices = self.search(phrase_embeddings, k)
+        return [[self.phrases[i] for i in row if i >= 0] for row in indices.tolist()]
+
+    def forward(self, phrase_embeddings):
+        """
+        Decodes a batch of embeddings into their nearest phrases, or a single embedding into its nearest phrase.
+        """
+        phrases = [row[0] for row in self.decode_top_k(phrase_embeddings, 1)]
+        return phrases[0] if torch.as_tensor(phrase_embeddings).dim() == 1 else phrases
+
+    def save(self, save_path):
+        """
+        Save the index. The list assignments are recomputed from the centroids when loading.
+        """
+        embeddings = self.embeddings
+        if self.approximate:
+            embeddings = torch.empty_like(embeddings)
+            embeddings[self.phrase_ids] = self.embeddings
+        torch.save({
+            'decoder': self.decoder_name,
+            'phrases': self.phrases,
+            'embeddings': embeddings.cpu(),
+            'metric': self.metric,
+            'approximate': self.approximate,
+            'n_probe': self.n_probe,
+            'centroids': self.centroids.cpu() if self.approximate else None,
+        }, save_path)
+
+    @staticmethod
+    def load(load_path):
+        """
+        Load the index from a saved state.
+        """
+        checkpoint = torch.load(load_path)
+        return NearestPhraseDecoder(
+            checkpoint['phrases'],
+            checkpoint['embeddings'],
+            metric=checkpoint['metric'],
+            approximate=checkpoint['approximate'],
+            n_probe=checkpoint['n_probe'],
+            centroids=checkpoint['centroids'],
+        )
+
+
+def _latency_percentiles(encoder, phrase_texts, repeats):
+    latencies = []
+    for _ in range(repeats):
+        for phrase in phrase_texts:
+            start = time.perf_counter()
+            encoder([phrase])
+            latencies.append(time.perf_counter() - start)
+    return np.percentile(latencies, [50, 95])
+
+
+def benchmark_sbert_inference(phrase_texts, model_name='all-MiniLM-L6-v2', num_threads=1, batch_size=32, latency_phrases=100, repeats=3):
+    """
+    Compares latency, throughput and accuracy of the int8 and float CPU encoders on a phrase set.
+    """
+    phrase_texts = list(phrase_texts)
+    encoders = {
+        'float': SBERTPhraseEmbeddingEncoder(model_name, num_threads=num_threads, batch_size=batch_size),
+        'int8': SBERTPhraseEmbeddingEncoder(model_name, quantized=True, num_threads=num_threads, batch_size=batch_size),
+    }
+
+    results = {}
+    embeddings = {}
+    for name, encoder in encoders.items():
+        encoder([phrase_texts[0]])
+        start = time.perf_counter()
+        embeddings[name] = encoder(phrase_texts).float().cpu()
+        batch_time = time.perf_counter() - start
+        p50, p95 = _latency_percentiles(encoder, phrase_texts[:latency_phrases], repeats)
+        results[name] = {'latency_p50_ms': p50 * 1000, 'latency_p95_ms': p95 * 1000, 'phrases_per_second': len(phrase_texts) / batch_time}
+
+    similarities = F.cosine_similarity(embeddings['float'], embeddings['int8'], dim=1)
+    decoder = NearestPhraseDecoder(phrase_texts, embeddings['float'])
+    _, nearest = decoder.search(embeddings['int8'], 1)
+    _, float_nearest = decoder.search(embeddings['float'], 1)
+    results['accuracy'] = {
+        'mean_cosine_similarity': similarities.mean().item(),
+        'min_cosine_similarity': similarities.min().item(),
+        'nearest_phrase_agreement': (nearest[:, 0] == float_nearest[:, 0]).float().mean().item(),
+    }
+    return results
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Checks the import time budget, or benchmarks quantized SBERT inference.')
+    parser.add_argument('--benchmark-sbert', metavar='PHRASES_FILE', help='text file with one phrase per line')
+    parser.add_argument('--model-name', default='all-MiniLM-L6-v2')
+    parser.add_argument('--num-threads', type=int, default=1)
+    parser.add_argument('--batch-size', type=int, default=32)
+    args = parser.parse_args()
+
+    if args.benchmark_sbert:
+        with open(args.benchmark_sbert, 'r', encoding='utf-8') as file:
+            phrases = [line.strip() for line in file if line.strip()]
+        results = benchmark_sbert_inference(phrases, args.model_name, args.num_threads, args.batch_size)
+        print(json.dumps(results, indent=4))
+        sys.exit(0)
+
+    elapsed, backends = measure_import_time()
+    print(f'Import took {elapsed * 1000:.1f} ms on top of torch (budget {IMPORT_TIME_BUDGET * 1000:.0f} ms)')
+    if backends:
+        print(f"Imported optional backends: {', '.join(backends)}")
+    if elapsed > IMPORT_TIME_BUDGET or backends:
+        sys.exit(1)
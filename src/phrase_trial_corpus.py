@@ -0,0 +1,170 @@
+from __future__ import annotations
+import os
+import pickle
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Tuple
+from numpy.typing import NDArray
+import numpy as np
+import pandas as pd
+from column_stream import COLUMN_FILE_EXTENSION, read_columns, write_header
+from phrase_trial_data import PhraseTrialData, StreamingPhraseTrialData
+
+
+class PhraseTrialCorpus:
+    '''Phrase trials of a directory concatenated per column and cached memory-mapped; baselines are left out of query().'''
+
+    INDEX_COLUMNS = ['user_id', 'trial_number', 'phrase', 'adverb', 'first_cartesian_direction', 'second_cartesian_direction']
+    TRANSFORMED_COLUMNS = ('position', 'velocity', 'external_force')
+    INDEX_FILE_NAME = 'index.pkl'
+    CACHE_VERSION = 2
+
+    def __init__(self, directory: str, transformation: NDArray | None = None, cache_dir_name: str = '.corpus_cache', workers: Optional[int] = None) -> None:
+        self.directory = directory
+        self.cache_dir = os.path.join(directory, cache_dir_name)
+        self.workers = workers
+        self._baselines = {}
+
+        file_stats = self._get_file_stats()
+        cached = self._load_cached_index()
+
+        if cached is None or cached.get('version') != self.CACHE_VERSION or cached['file_stats'] != file_stats:
+            self._build_cache(file_stats)
+            cached = self._load_cached_index()
+
+        self.index: pd.DataFrame = cached['index']
+        self.offsets: NDArray = cached['offsets']
+        self.columns: Dict[str, NDArray] = read_columns(self.cache_dir)
+
+        if transformation is not None:
+            self.transform(transformation)
+
+    def _get_file_stats(self) -> Dict[str, Tuple[int, int]]:
+        file_stats = {}
+
+        for file_name in sorted(os.listdir(self.directory)):
+            file_path = os.path.join(self.directory, file_name)
+
+            if file_name.endswith('.pkl'):
+                stat = os.stat(file_path)
+            elif file_name.endswith('.trial'):
+                stat = os.stat(os.path.join(file_path, StreamingPhraseTrialData.ATTRIBUTES_FILE_NAME))
+            else:
+                continue
+
+            file_stats[file_name] = (stat.st_mtime_ns, stat.st_size)
+
+        return file_stats
+
+    def _load_cached_index(self) -> dict | None:
+        index_path = os.path.join(self.cache_dir, self.INDEX_FILE_NAME)
+
+        if not os.path.exists(index_path):
+            return None
+
+        with open(index_path, 'rb') as file:
+            return pickle.load(file)
+
+    def _load_trial(self, file_name: str) -> Tuple[List, Dict[str, NDArray]]:
+        data = PhraseTrialData.load(os.path.join(self.directory, file_name))
+        attributes = [getattr(data, column, None) for column in self.INDEX_COLUMNS]
+        columns = {name: np.asarray(getattr(data, name), dtype=np.float64) for name in StreamingPhraseTrialData.COLUMN_NAMES}
+        return attributes, columns
+
+    @staticmethod
+    def _baseline_direction(file_name: str) -> str | None:
+        # trials are saved as '{user_id}__{index}__{phrase}', baselines as '{user_id}__{direction}'
+        parts = os.path.splitext(file_name)[0].split('__')
+        if len(parts) == 2 and not parts[1].isdigit():
+            return parts[1]
+        return None
+
+    def _build_cache(self, file_stats: Dict[str, Tuple[int, int]]) -> None:
+        file_names = list(file_stats.keys())
+
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            trials = list(executor.map(self._load_trial, file_names))
+
+        lengths = np.array([len(columns['time']) for _, columns in trials], dtype=np.int64)
+        offsets = np.zeros(len(trials) + 1, dtype=np.int64)
+        np.cumsum(lengths, out=offsets[1:])
+
+        # trials may record e.g. internal_force as a scalar placeholder, so broadcast to the widest row shape
+        shapes = {}
+        for name in StreamingPhraseTrialData.COLUMN_NAMES:
+            row_shapes = [columns[name].shape[1:] for _, columns in trials if len(columns[name]) > 0]
+            shapes[name] = max(row_shapes, key=len) if row_shapes else ()
+
+        if os.path.exists(self.cache_dir):
+            shutil.rmtree(self.cache_dir)
+        os.makedirs(self.cache_dir)
+
+        write_header(self.cache_dir, {name: (np.float64, shape) for name, shape in shapes.items()})
+
+        for name, shape in shapes.items():
+            column = np.empty((offsets[-1],) + shape, dtype=np.float64)
+
+            for (_, columns), start, stop in zip(trials, offsets[:-1], offsets[1:]):
+                values = columns[name]
+                if values.ndim == 1 and len(shape) > 0:
+                    values = values.reshape((-1,) + (1,) * len(shape))
+                column[start:stop] = values
+
+            column.tofile(os.path.join(self.cache_dir, name + COLUMN_FILE_EXTENSION))
+
+        index = pd.DataFrame([attributes for attributes, _ in trials], columns=self.INDEX_COLUMNS)
+        index['file_name'] = file_names
+        index['baseline_direction'] = [self._baseline_direction(file_name) for file_name in file_names]
+        index['is_baseline'] = index['baseline_direction'].notna()
+        index['start'] = offsets[:-1]
+        index['stop'] = offsets[1:]
+
+        with open(os.path.join(self.cache_dir, self.INDEX_FILE_NAME), 'wb') as file:
+            pickle.dump({'version': self.CACHE_VERSION, 'file_stats': file_stats, 'index': index, 'offsets': offsets}, file)
+
+    def transform(self, transformation: NDArray) -> None:
+        for name in self.TRANSFORMED_COLUMNS:
+            self.columns[name] = self.columns[name] @ transformation.T
+
+    def __len__(self) -> int:
+        return len(self.index)
+
+    def __getitem__(self, key: str) -> NDArray:
+        return self.columns[key]
+
+    def query(self, include_baselines: bool = False, **attributes) -> pd.DataFrame:
+        mask = np.ones(len(self.index), dtype=bool) if include_baselines else ~self.index['is_baseline'].to_numpy()
+
+        for name, value in attributes.items():
+            mask &= (self.index[name] == value).to_numpy()
+
+        return self.index[mask]
+
+    def trial_slice(self, i: int) -> slice:
+        return slice(self.offsets[i], self.offsets[i + 1])
+
+    def trial(self, i: int) -> PhraseTrialData:
+        row = self.index.iloc[i]
+        phrase_trial_data = PhraseTrialData(*(row[column] for column in self.INDEX_COLUMNS))
+        trial_slice = self.trial_slice(i)
+
+        for name in StreamingPhraseTrialData.COLUMN_NAMES:
+            setattr(phrase_trial_data, name, self.columns[name][trial_slice])
+
+        return phrase_trial_data
+
+    def baseline(self, i: int) -> int | None:
+        row = self.index.iloc[i]
+        key = (row['user_id'], row['first_cartesian_direction'])
+
+        if key not in self._baselines:
+            matches = self.query(include_baselines=True, is_baseline=True, user_id=key[0], baseline_direction=key[1])
+            self._baselines[key] = None if matches.empty else int(matches.index[0])
+
+        return self._baselines[key]
+
+    def reduce_trials(self, values: NDArray) -> NDArray:
+        sums = np.zeros((len(self),) + values.shape[1:], dtype=values.dtype)
+        non_empty = np.diff(self.offsets) > 0
+        sums[non_empty] = np.add.reduceat(values, self.offsets[:-1][non_empty], axis=0)
+        return sums
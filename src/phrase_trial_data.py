@@ -1,13 +1,18 @@
 from __future__ import annotations
 import os
 import pickle
-from typing import Tuple
+import shutil
+from typing import Dict, Tuple
 from numpy.typing import NDArray
 import numpy as np
+from column_stream import ColumnStreamWriter, read_columns
 
 class PhraseTrialData:
     @classmethod
     def load(cls, file_path: str, transformation: NDArray | None = None):
+        if os.path.isdir(file_path):
+            return StreamingPhraseTrialData.load(file_path, transformation)
+
         with open(file_path, 'rb') as file:
             data = pickle.load(file)
             phrase_trial_data = cls(None, None, None, None, None, None,)
@@ -55,3 +60,81 @@ class PhraseTrialData:
 
         with open(file_path, 'wb') as file:
             pickle.dump(self, file)
+
+
+class StreamingPhraseTrialData(PhraseTrialData):
+    """PhraseTrialData streamed to disk through a ColumnStreamWriter while the trial runs."""
+
+    COLUMN_NAMES = ('time', 'dt', 'position', 'velocity', 'external_force', 'internal_force')
+    COLUMN_SHAPES = {'time': (), 'dt': (), 'position': (3,), 'velocity': (3,), 'external_force': (3,), 'internal_force': (3,)}
+    ATTRIBUTES_FILE_NAME = 'attributes.pkl'
+
+    @classmethod
+    def load(cls, file_path: str, transformation: NDArray | None = None, mmap: bool = True):
+        with open(os.path.join(file_path, cls.ATTRIBUTES_FILE_NAME), 'rb') as file:
+            attributes = pickle.load(file)
+
+        phrase_trial_data = cls.__new__(cls)
+        phrase_trial_data.__dict__.update(attributes)
+        phrase_trial_data._writer = None
+        phrase_trial_data.__dict__.update(read_columns(file_path, mmap=mmap))
+
+        if transformation is not None:
+            phrase_trial_data.position = phrase_trial_data.position @ transformation.T
+            phrase_trial_data.velocity = phrase_trial_data.velocity @ transformation.T
+            phrase_trial_data.external_force = phrase_trial_data.external_force @ transformation.T
+
+        return phrase_trial_data
+
+    def __init__(self, user_id: int, trial_number: int, phrase: str, adverb: str, first_cartesian_direction: str, second_cartesian_direction: str, stream_dir: str, shapes: Dict[str, Tuple[int, ...]] | None = None, chunk_size: int = 256, queue_chunks: int = 8):
+        super().__init__(user_id, trial_number, phrase, adverb, first_cartesian_direction, second_cartesian_direction)
+        self.stream_dir = stream_dir
+        self.shapes = {**self.COLUMN_SHAPES, **(shapes or {})}
+        self.chunk_size = chunk_size
+        self.queue_chunks = queue_chunks
+        self.stream_path = os.path.join(stream_dir, f"{user_id}__{trial_number}.partial")
+
+        # opened here rather than on the first append, which runs on the control thread
+        if os.path.exists(self.stream_path):
+            shutil.rmtree(self.stream_path)
+
+        columns = {name: (np.float64, self.shapes[name]) for name in self.COLUMN_NAMES}
+        self._writer = ColumnStreamWriter(self.stream_path, columns, chunk_size, queue_chunks)
+        self._save_attributes(self.stream_path)
+
+    def _attributes(self) -> dict:
+        return {key: value for key, value in self.__dict__.items() if key not in self.COLUMN_NAMES and key != '_writer'}
+
+    def _save_attributes(self, dir: str) -> None:
+        temporary_path = os.path.join(dir, self.ATTRIBUTES_FILE_NAME + '.tmp')
+        with open(temporary_path, 'wb') as file:
+            pickle.dump(self._attributes(), file)
+        os.replace(temporary_path, os.path.join(dir, self.ATTRIBUTES_FILE_NAME))
+
+    def append(self, time: float, dt: float, position: NDArray, velocity: NDArray, external_force: NDArray, internal_force: NDArray) -> None:
+        self._writer.append(time, dt, position, velocity, external_force, internal_force)
+
+    def close(self) -> None:
+        if self._writer is not None:
+            self._writer.close()
+
+    def save(self, index: int, dir: str) -> None:
+        os.makedirs(dir, exist_ok=True)
+
+        if self._writer is None or self._writer.rows == 0:
+            raise RuntimeError("Can't save phrase trial data because no samples have been appended.")
+
+        self.close()
+        self._save_attributes(self.stream_path)
+
+        safe_phrase = self.phrase.replace(" ", "_")
+
+        dir_name = f"{self.user_id}__{index}__{safe_phrase}.trial"
+
+        dir_path = os.path.join(dir, dir_name)
+
+        if os.path.exists(dir_path):
+            shutil.rmtree(dir_path)
+
+        shutil.move(self.stream_path, dir_path)
+        self.stream_path = dir_path
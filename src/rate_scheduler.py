@@ -0,0 +1,70 @@
+from typing import Callable
+import time
+
+CATCH_UP = 'catch_up'
+SKIP = 'skip'
+
+_overrun_policies = (CATCH_UP, SKIP)
+
+
+def sleep_until(deadline: float, spin_threshold: float = 0.001, clock: Callable[[], float] = time.perf_counter) -> None:
+    # time.sleep overshoots by up to a scheduler quantum, so sleep only until
+    # spin_threshold before the deadline and busy-wait the remainder
+    remaining = deadline - clock()
+
+    if remaining > spin_threshold:
+        time.sleep(remaining - spin_threshold)
+
+    while clock() < deadline:
+        pass
+
+
+class RateScheduler:
+    def __init__(self, rate: float, overrun_policy: str = SKIP, spin_threshold: float = 0.001, clock: Callable[[], float] = time.perf_counter) -> None:
+        if rate <= 0:
+            raise ValueError(f'Invalid value for rate: {rate}. Must be a positive number.')
+
+        if overrun_policy not in _overrun_policies:
+            raise ValueError(f"Unsupported overrun policy '{overrun_policy}' received. Supported policies are: {', '.join(_overrun_policies)}.")
+
+        self.rate = rate
+        self.period = 1.0 / rate
+        self.overrun_policy = overrun_policy
+        self.spin_threshold = spin_threshold
+        self.clock = clock
+        self.reset()
+
+    def reset(self) -> None:
+        self.start_time = self.clock()
+        self.deadline = self.start_time + self.period
+        self.ticks = 0
+        self.overruns = 0
+        self.skipped_ticks = 0
+        self.jitter = 0.0
+        self.max_jitter = 0.0
+        self._jitter_sum = 0.0
+
+    def mean_jitter(self) -> float:
+        return 0.0 if self.ticks == 0 else self._jitter_sum / self.ticks
+
+    def wait(self) -> float:
+        # returns how late the deadline was met; 'skip' drops missed deadlines, 'catch_up' honours them back to back
+        now = self.clock()
+
+        if now > self.deadline:
+            self.overruns += 1
+
+            if self.overrun_policy == SKIP:
+                missed = int((now - self.deadline) / self.period) + 1
+                self.skipped_ticks += missed
+                self.deadline += missed * self.period
+
+        sleep_until(self.deadline, self.spin_threshold, self.clock)
+
+        self.jitter = self.clock() - self.deadline
+        self.max_jitter = max(self.max_jitter, self.jitter)
+        self._jitter_sum += self.jitter
+        self.ticks += 1
+        self.deadline += self.period
+
+        return self.jitter
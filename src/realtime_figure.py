@@ -2,16 +2,21 @@ from typing import List, Optional, Tuple, Dict, Any
 from numbers import Number
 from matplotlib import pyplot as plt
 import numpy as np
-from IPython.display import clear_output
+from IPython.display import clear_output, display
 from timer import Timer
 
 class RealtimeFigure:
+    '''With blit=True the artists are created once and only their data is updated.'''
+
+    BLITTABLE = False
+
     def __init__(
         self,
         rows: int = 1,
         columns: int = 1,
         subplot_options_set: Optional[List[Optional[Dict[str, Any]]]] = None,
         refresh_rate: int = 10,
+        blit: bool = False,
     ):
         for name, value in [('rows', rows),
                             ('columns', columns)]:
@@ -25,8 +30,11 @@ class RealtimeFigure:
         self.columns = columns
         self.subplot_options_set = subplot_options_set
         self.refresh_rate = refresh_rate
+        self.blit = blit
         self.initialized = False
         self.timer = Timer()
+        self.lines = None
+        self.full_redraw = True
 
     def subplots_num(self):
         return self.rows * self.columns
@@ -35,7 +43,30 @@ class RealtimeFigure:
         self.fig, axes = plt.subplots(self.rows, self.columns)
         self.axes = axes.ravel() if self.subplots_num() > 1 else np.asarray([axes])
 
+    def get_subplot_options(self, i: int) -> Optional[Dict[str, Any]]:
+        if self.subplot_options_set and i < len(self.subplot_options_set):
+            return self.subplot_options_set[i]
+        return None
+
+    def apply_subplot_options(self, ax, lines, options: Dict[str, Any]):
+        subplot_option_methods = {
+            "title": ax.set_title,
+            "xlabel": ax.set_xlabel,
+            "ylabel": ax.set_ylabel,
+            "xlim": ax.set_xlim,
+            "ylim": ax.set_ylim,
+            "colors": lambda colors: [line.set_color(color) for line, color in zip(lines, colors)]
+        }
+
+        for option, value in options.items():
+            if option in subplot_option_methods:
+                subplot_option_methods[option](value)
+
     def update_subplots(self, data_sets: List[Optional[Tuple[List[Number], List[Number]]]]):
+        if self.blit:
+            self.update_artists(data_sets)
+            return
+
         for i, (data_set, ax) in enumerate(zip(data_sets, self.axes)):
             if data_set == None:
                 continue
@@ -51,24 +82,67 @@ class RealtimeFigure:
 
             ax.grid(True)
 
-            if self.subplot_options_set and i < len(self.subplot_options_set) and self.subplot_options_set[i]:
-                subplot_option_methods = {
-                    "title": ax.set_title,
-                    "xlabel": ax.set_xlabel,
-                    "ylabel": ax.set_ylabel,
-                    "xlim": ax.set_xlim,
-                    "ylim": ax.set_ylim,
-                    "colors": lambda colors: [line.set_color(color) for line, color in zip(lines, colors)]
-                }
-
-                for option, value in self.subplot_options_set[i].items():
-                    if option in subplot_option_methods:
-                        subplot_option_methods[option](value)
+            options = self.get_subplot_options(i)
+            if options:
+                self.apply_subplot_options(ax, lines, options)
 
         self.fig.tight_layout()
 
+    def _fit_limits(self, get_limits, set_limits, values: np.ndarray):
+        if values.size == 0:
+            return
+
+        low, high = np.nanmin(values), np.nanmax(values)
+        limit_low, limit_high = get_limits()
+
+        if low < limit_low or high > limit_high:
+            margin = 0.1 * (high - low) if high > low else 1.0
+            set_limits(low - margin, high + margin)
+            self.full_redraw = True
+
+    def update_artists(self, data_sets: List[Optional[Tuple[List[Number], List[Number]]]]):
+        if self.lines is None:
+            self.lines = [None] * len(self.axes)
+            self.applied_options = [None] * len(self.axes)
+
+        for i, (data_set, ax) in enumerate(zip(data_sets, self.axes)):
+            if data_set is None:
+                continue
+
+            x, y = np.asarray(data_set[0]), np.asarray(data_set[1])
+
+            if len(x) != len(y):
+                raise ValueError(f'x and y must have the same length, but got {len(x)} and {len(y)} respectively.')
+
+            y = y.reshape(len(y), -1)
+
+            if self.lines[i] is None or len(self.lines[i]) != y.shape[1]:
+                for line in self.lines[i] or []:
+                    line.remove()
+                self.lines[i] = ax.plot(x, y, color='black', animated=self.BLITTABLE)
+                ax.grid(True)
+                self.applied_options[i] = None
+                self.full_redraw = True
+            else:
+                for j, line in enumerate(self.lines[i]):
+                    line.set_data(x, y[:, j])
+
+            options = self.get_subplot_options(i) or {}
+            if options != self.applied_options[i]:
+                self.apply_subplot_options(ax, self.lines[i], options)
+                self.applied_options[i] = dict(options)
+                self.full_redraw = True
+
+            if 'xlim' not in options:
+                self._fit_limits(ax.get_xlim, ax.set_xlim, x)
+            if 'ylim' not in options:
+                self._fit_limits(ax.get_ylim, ax.set_ylim, y)
+
+    def is_due(self) -> bool:
+        return self.timer.t() >= 1 / self.refresh_rate
+
     def update(self, data_sets: List[Optional[Tuple[List[Number], List[Number]]]]):
-        if self.timer.t() < 1 / self.refresh_rate:
+        if not self.is_due():
             return
 
         self.timer.reset()
@@ -93,23 +167,63 @@ class RealtimeFigureInline(RealtimeFigure):
     def initialize(self):
         plt.switch_backend('module://matplotlib_inline.backend_inline')
 
+        if self.blit:
+            self.init_subplots()
+
     def pre_update_hook(self):
-        self.init_subplots()
+        if not self.blit:
+            self.init_subplots()
 
     def render(self):
         clear_output(wait=True)
-        plt.show(block=False)
+
+        if not self.blit:
+            plt.show(block=False)
+            return
+
+        # inline output is a static image, so the persistent figure is redrawn as a whole
+        if self.full_redraw:
+            self.fig.tight_layout()
+            self.full_redraw = False
+        display(self.fig)
 
 class RealtimeFigureWindow(RealtimeFigure):
+    BLITTABLE = True
+
     def initialize(self):
         plt.switch_backend('TkAgg')
         plt.ion()
         self.init_subplots()
         self.fig.canvas.manager.window.wm_title("RealtimeFigure")
+        self.background = None
+        self.fig.canvas.mpl_connect('resize_event', self.on_resize)
+
+    def on_resize(self, event):
+        self.full_redraw = True
 
     def render(self):
-        self.fig.canvas.draw()
-        self.fig.canvas.flush_events()
+        canvas = self.fig.canvas
+
+        if not self.blit:
+            canvas.draw()
+            canvas.flush_events()
+            return
+
+        if self.full_redraw or self.background is None:
+            # the lines are animated artists, so the cached background contains everything but them
+            self.fig.tight_layout()
+            canvas.draw()
+            self.background = canvas.copy_from_bbox(self.fig.bbox)
+            self.full_redraw = False
+        else:
+            canvas.restore_region(self.background)
+
+        for ax, lines in zip(self.axes, self.lines):
+            for line in lines or []:
+                ax.draw_artist(line)
+
+        canvas.blit(self.fig.bbox)
+        canvas.flush_events()
 
 _mode_to_realtime_figure_subclass_map: Dict[str, RealtimeFigure] = {
     'inline': RealtimeFigureInline,
@@ -126,8 +240,9 @@ def create(
         subplot_options_set: Optional[List[Optional[Dict[str, Any]]]] = None,
         refresh_rate: int = 10,
         mode: str = 'inline',
+        blit: bool = False,
     ) -> RealtimeFigure:
     if mode in _mode_to_realtime_figure_subclass_map:
-        return _mode_to_realtime_figure_subclass_map[mode](rows, columns, subplot_options_set, refresh_rate)
+        return _mode_to_realtime_figure_subclass_map[mode](rows, columns, subplot_options_set, refresh_rate, blit)
     else:
         raise ValueError(f"Unsupported mode '{mode}' received. Supported modes are: {_modes_string}.")
\ No newline at end of file
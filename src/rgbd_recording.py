@@ -0,0 +1,192 @@
+from __future__ import annotations
+from numpy.typing import DTypeLike, NDArray
+from typing import Dict, Optional
+import numpy as np
+import time
+import sys
+from camera import Camera, Intrinsics
+from column_stream import ColumnStreamWriter, read_columns
+from rgbd_stream import RGBDFrame, RGBDStream, RGBDStream_iOS
+from timer import Timer
+
+
+class RGBDRecorder:
+    '''Records RGBD frames and their cameras into a column stream directory.'''
+
+    def __init__(self, dir_path: str, chunk_size: int = 30, queue_chunks: int = 4) -> None:
+        self.dir_path = dir_path
+        self.chunk_size = chunk_size
+        self.queue_chunks = queue_chunks
+        self.writer = None
+        self.timer = Timer()
+
+    def _open(self, frame: RGBDFrame) -> None:
+        columns = {
+            'timestamp': (np.float64, ()),
+            'rgb': (np.uint8, frame.rgb.shape),
+            'depth': (np.float32, frame.depth.shape),
+            'confidence': (np.uint8, frame.confidence.shape),
+            'intrinsics': (np.float64, (5,)),
+            'position': (np.float64, (3,)),
+            'rotation_matrix': (np.float64, (3, 3)),
+            'inverse_rotation_matrix': (np.float64, (3, 3)),
+        }
+        self.writer = ColumnStreamWriter(self.dir_path, columns, self.chunk_size, self.queue_chunks)
+        self._rgb = np.empty(frame.rgb.shape, dtype=np.uint8)
+        self._scaled_rgb = np.empty(frame.rgb.shape, dtype=np.float32)
+        self._intrinsics = np.empty(5)
+        self.timer.reset()
+
+    def record(self, frame: RGBDFrame) -> None:
+        if self.writer is None:
+            self._open(frame)
+
+        intrinsics = frame.camera.intrinsics
+        self._intrinsics[:] = (intrinsics.fx, intrinsics.fy, intrinsics.px, intrinsics.py, intrinsics.orthographic)
+        np.multiply(frame.rgb, 255.0, out=self._scaled_rgb)
+        np.rint(self._scaled_rgb, out=self._scaled_rgb)
+        np.copyto(self._rgb, self._scaled_rgb, casting='unsafe')
+
+        self.writer.append(
+            self.timer.t(),
+            self._rgb,
+            frame.depth,
+            frame.confidence,
+            self._intrinsics,
+            frame.camera.position,
+            frame.camera.rotation_matrix,
+            frame.camera.inverse_rotation_matrix)
+
+    def close(self) -> None:
+        if self.writer is not None:
+            self.writer.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+class RGBDStream_Replay(RGBDStream):
+    '''Replays an RGBDRecorder recording, stamping frames with time.perf_counter() as they are replayed.'''
+
+    def __init__(self, dir_path: str, realtime: bool = True, loop: bool = False, dtype: DTypeLike = np.float64) -> None:
+        self.dir_path = dir_path
+        self.realtime = realtime
+        self.loop = loop
+        self.dtype = dtype
+        self.columns: Dict[str, NDArray] = read_columns(dir_path)
+        self.frames = len(self.columns['timestamp'])
+
+        if self.frames == 0:
+            raise RuntimeError(f'Recording {dir_path} contains no frames.')
+
+        self.streaming = False
+        self.timer = Timer()
+        self._index = -1
+        self._sequence_number = 0
+        self._frame_timestamp = time.perf_counter()
+        self._rgb_buffers = [np.empty(self.columns['rgb'].shape[1:], dtype=np.float32) for _ in range(2)]
+
+    def start(self) -> None:
+        self.streaming = True
+        self._index = -1
+        self.timer.reset()
+        self._frame_timestamp = time.perf_counter()
+
+    def is_running(self) -> bool:
+        return self.streaming
+
+    def stop(self) -> None:
+        self.streaming = False
+
+    def wait_for_frames(self, timeout: Optional[float] = None) -> bool:
+        if self._index + 1 >= self.frames:
+            if not self.loop:
+                self.stop()
+                return False
+            self._index = -1
+            self.timer.reset()
+
+        self._index += 1
+
+        if self.realtime:
+            delay = self.columns['timestamp'][self._index] - self.columns['timestamp'][0] - self.timer.t()
+            if timeout is not None and delay > timeout:
+                # the frame stays pending, so the next call picks it up
+                time.sleep(timeout)
+                self._index -= 1
+                return False
+            if delay > 0.0:
+                time.sleep(delay)
+
+        self._frame_timestamp = time.perf_counter()
+        return True
+
+    def get_camera(self, index: int) -> Camera:
+        fx, fy, px, py, orthographic = self.columns['intrinsics'][index]
+        intrinsics = Intrinsics(1.0, 1.0, fx, fy, px, py, bool(orthographic))
+        return Camera(intrinsics, np.array(self.columns['position'][index]), np.array(self.columns['rotation_matrix'][index]),
+                      np.array(self.columns['inverse_rotation_matrix'][index]))
+
+    def get_frame(self) -> RGBDFrame:
+        index = max(self._index, 0)
+        self._sequence_number += 1
+
+        rgb = self._rgb_buffers[self._sequence_number % 2]
+        np.multiply(self.columns['rgb'][index], np.float32(1.0 / 255.0), out=rgb)
+
+        return RGBDFrame(
+            rgb,
+            self.columns['depth'][index],
+            self.columns['confidence'][index],
+            self.get_camera(index),
+            self.dtype,
+            self._sequence_number,
+            self._frame_timestamp)
+
+
+def record(dir_path: str, frames: int) -> None:
+    stream = RGBDStream_iOS()
+    stream.start()
+
+    with RGBDRecorder(dir_path) as recorder:
+        for _ in range(frames):
+            stream.wait_for_frames()
+            recorder.record(stream.get_frame())
+
+    stream.stop()
+
+
+def benchmark(dir_path: str, dtype: DTypeLike = np.float64) -> None:
+    stream = RGBDStream_Replay(dir_path, realtime=False, dtype=dtype)
+    stream.start()
+    timer = Timer()
+    frames = 0
+
+    while True:
+        stream.wait_for_frames()
+        if not stream.is_running():
+            break
+
+        frame = stream.get_frame()
+        frame.resized_rgb
+        frame.normals
+        frame.get_filtered_world_points(min_confidence=1)
+        frames += 1
+
+    elapsed = timer.t()
+    print(f'{frames} frames in {elapsed:.3f} s: {frames / elapsed:.1f} fps')
+
+
+if __name__ == '__main__':
+    if len(sys.argv) < 3 or sys.argv[1] not in ('record', 'benchmark'):
+        print('Usage: python rgbd_recording.py record <directory> <frames>\n'
+              '       python rgbd_recording.py benchmark <directory> [float32|float64]')
+        sys.exit(1)
+
+    if sys.argv[1] == 'record':
+        record(sys.argv[2], int(sys.argv[3]))
+    else:
+        benchmark(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else np.float64)
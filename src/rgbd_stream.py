@@ -1,10 +1,15 @@
 import numpy as np
-from typing import Tuple
-from numpy.typing import NDArray
+from functools import cached_property
+from typing import Dict, Optional, Tuple
+from numpy.typing import DTypeLike, NDArray
 from record3d import Record3DStream
-from threading import Event
+from threading import Event, RLock
+import threading
+import time
+import weakref
 import cv2
 from camera import Camera, Intrinsics
+from stoppable_thread import StoppableThread
 
 
 def quaternion_to_matrix(quaternion: NDArray) -> NDArray:
@@ -22,25 +27,65 @@ def quaternion_to_matrix(quaternion: NDArray) -> NDArray:
     ])
 
 
-class RGBDFrame:
-    def __init__(self, rgb: NDArray, depth: NDArray, confidence: NDArray, camera: Camera) -> None:
-        self.rgb = rgb
-        self.depth = depth
-        self.confidence = confidence
-        self.camera = camera
+# maps the transposed device rotation to the inverse camera rotation: swaps the first two rows and negates the new
+# second row
+_DEVICE_AXES = np.array([
+    [0.0, 1.0, 0.0],
+    [-1.0, 0.0, 0.0],
+    [0.0, 0.0, 1.0]])
+
+
+_pixel_grids: Dict[Tuple[int, int, np.dtype], NDArray] = {}
 
-        self.resized_rgb = cv2.resize(rgb, np.flip(depth.shape))
-        self.resized_depth = cv2.resize(depth, np.flip(rgb.shape[0:2]))
 
+def get_pixel_grid(height: int, width: int, dtype: DTypeLike = np.float64) -> NDArray:
+    key = (height, width, np.dtype(dtype))
+
+    if key not in _pixel_grids:
         x, y = np.meshgrid(
-            np.arange(depth.shape[1]), np.arange(depth.shape[0]))
-        self.xyz = np.stack([x + 0.5, y + 0.5, depth], axis=-1)
+            np.arange(width, dtype=dtype), np.arange(height, dtype=dtype))
+        grid = np.stack([x + 0.5, y + 0.5], axis=-1)
+        grid.flags.writeable = False
+        _pixel_grids[key] = grid
 
-    def compute_XYZ(self) -> None:
-        self.XYZ = self.camera.screen_to_world(
-            self.xyz, self.depth.shape[1], self.depth.shape[0])
+    return _pixel_grids[key]
 
-    def get_normals(self) -> NDArray:
+
+class RGBDFrame:
+    '''Derived fields are computed on first access and cached on the frame.'''
+
+    def __init__(self, rgb: NDArray, depth: NDArray, confidence: NDArray, camera: Camera, dtype: DTypeLike = np.float64, sequence_number: int = 0, timestamp: float = 0.0) -> None:
+        self.rgb = rgb
+        self.depth = depth
+        self.confidence = confidence
+        self.camera = camera
+        self.dtype = np.dtype(dtype)
+        self.sequence_number = sequence_number
+        self.timestamp = timestamp
+
+    @cached_property
+    def resized_rgb(self) -> NDArray:
+        return cv2.resize(self.rgb, np.flip(self.depth.shape))
+
+    @cached_property
+    def resized_depth(self) -> NDArray:
+        return cv2.resize(self.depth, np.flip(self.rgb.shape[0:2]))
+
+    @cached_property
+    def xyz(self) -> NDArray:
+        xyz = np.empty(self.depth.shape + (3,), dtype=self.dtype)
+        xyz[..., 0:2] = get_pixel_grid(self.depth.shape[0], self.depth.shape[1], self.dtype)
+        xyz[..., 2] = self.depth
+        return xyz
+
+    @cached_property
+    def XYZ(self) -> NDArray:
+        XYZ = np.empty(self.xyz.shape, dtype=self.dtype)
+        return self.camera.screen_to_world(
+            self.xyz, self.depth.shape[1], self.depth.shape[0], out=XYZ)
+
+    @cached_property
+    def normals(self) -> NDArray:
         down_shift_XYZ = np.roll(self.XYZ, 1, axis=0)
         right_shift_XYZ = np.roll(self.XYZ, 1, axis=1)
 
@@ -50,6 +95,15 @@ class RGBDFrame:
 
         return normals
 
+    def compute_XYZ(self) -> None:
+        # recomputes with the camera's current (e.g. newly calibrated) pose
+        self.__dict__.pop('XYZ', None)
+        self.__dict__.pop('normals', None)
+        self.XYZ
+
+    def get_normals(self) -> NDArray:
+        return self.normals
+
     def get_filtered_world_points(self, min_confidence=0) -> Tuple[NDArray, NDArray]:
         valid_depth = self.confidence >= min_confidence
 
@@ -95,15 +149,53 @@ class RGBDStream:
     def stop(self) -> None:
         raise NotImplementedError()
 
-    def wait_for_frames(self) -> None:
+    def wait_for_frames(self, timeout: Optional[float] = None) -> bool:
         raise NotImplementedError()
 
     def get_frame(self) -> RGBDFrame:
         raise NotImplementedError()
 
 
+class _FrameBuffer:
+    def __init__(self, rgb_shape: Tuple[int, ...], depth_shape: Tuple[int, ...], confidence_shape: Tuple[int, ...]) -> None:
+        self.rgb = np.empty(rgb_shape, dtype=np.float32)
+        self.depth = np.empty(depth_shape, dtype=np.float32)
+        self.confidence = np.empty(confidence_shape, dtype=np.uint8)
+        self.camera = None
+        self.sequence_number = 0
+        self.timestamp = 0.0
+        self.readers = 0
+
+    def matches(self, rgb_shape: Tuple[int, ...], depth_shape: Tuple[int, ...], confidence_shape: Tuple[int, ...]) -> bool:
+        return self.rgb.shape == rgb_shape and self.depth.shape == depth_shape and self.confidence.shape == confidence_shape
+
+
+def _rotated_shape(shape: Tuple[int, ...]) -> Tuple[int, ...]:
+    return (shape[1], shape[0]) + tuple(shape[2:])
+
+
+def _capture_frames(stop_event: threading.Event, stream: 'RGBDStream_iOS') -> None:
+    while not stop_event.is_set():
+        if not stream._session_event.wait(timeout=0.1):
+            continue
+        stream._session_event.clear()
+        stream._capture_frame()
+
+
 class RGBDStream_iOS(RGBDStream):
-    def __init__(self, device_index=0) -> None:
+    '''With threaded=True frames are captured into a bounded pool of buffers, each reused only once no frame references it.'''
+
+    BUFFERS = 3
+
+    def __init__(self, device_index=0, dtype: DTypeLike = np.float64, threaded: bool = True, pose_tolerance: float = 1e-5, max_buffers: int = 8) -> None:
+        if max_buffers < self.BUFFERS:
+            raise ValueError(f'Invalid value for max_buffers: {max_buffers}. Must be at least {self.BUFFERS}.')
+
+        self.dtype = dtype
+        self.threaded = threaded
+        self.pose_tolerance = pose_tolerance
+        self.max_buffers = max_buffers
+        self.dropped_frames = 0
         devices = Record3DStream.get_connected_devices()
         print('{} device(s) found'.format(len(devices)))
         for device in devices:
@@ -122,25 +214,56 @@ class RGBDStream_iOS(RGBDStream):
 
         self.event = Event()
         self.streaming = False
+        self._raw_rgb_shape = None
+
+        self._session_event = Event()
+        self._buffers = [None] * self.BUFFERS
+        # reentrant, as releasing a frame's buffer may run from garbage collection while the lock is held
+        self._buffers_lock = RLock()
+        self._latest_buffer = None
+        self._first_frame = Event()
+        self._sequence_number = 0
+        self._frame_timestamp = time.perf_counter()
+        self._capture_thread = None
+        self._camera = None
+        self._camera_key = None
+        self._camera_pose = None
 
     def on_new_frame(self) -> None:
-        self.event.set()
+        if self.threaded:
+            self._session_event.set()
+        else:
+            self._frame_timestamp = time.perf_counter()
+            self.event.set()
 
     def start(self) -> None:
         self.streaming = True
 
+        if self.threaded and self._capture_thread is None:
+            self._capture_thread = StoppableThread(_capture_frames, self, name='rgbd_capture_thread')
+            self._capture_thread.start()
+
     def is_running(self) -> bool:
         return self.streaming
 
     def stop(self) -> None:
         self.streaming = False
 
-    def wait_for_frames(self) -> None:
-        self.event.wait()
+        if self._capture_thread is not None:
+            self._capture_thread.stop()
+            if self._capture_thread is not threading.current_thread():
+                self._capture_thread.join()
+            self._capture_thread = None
+
+    def wait_for_frames(self, timeout: Optional[float] = None) -> bool:
+        if not self.event.wait(timeout):
+            return False
         self.event.clear()
+        return True
 
     def _get_rgb_frame(self) -> NDArray:
         rgb = self.session.get_rgb_frame()
+        self._raw_rgb_shape = rgb.shape
         rgb = cv2.rotate(rgb, cv2.ROTATE_90_COUNTERCLOCKWISE)
         return rgb.astype(np.float32) / 255.0
 
@@ -155,10 +278,19 @@ class RGBDStream_iOS(RGBDStream):
         return confidence
 
     def get_camera(self) -> Camera:
+        # the same Camera is returned while the pose stays within pose_tolerance, so cameras must not be modified in place
         intrinsics = self.session.get_intrinsic_mat()
         extrinsics = self.session.get_camera_pose()
 
-        rgb_shape = self.session.get_rgb_frame().shape
+        rgb_shape = self._raw_rgb_shape if self._raw_rgb_shape is not None else self.session.get_rgb_frame().shape
+        key = (rgb_shape, intrinsics.fx, intrinsics.fy, intrinsics.tx, intrinsics.ty)
+        pose = np.array([extrinsics.tx, extrinsics.ty, extrinsics.tz,
+                         extrinsics.qx, extrinsics.qy, extrinsics.qz, extrinsics.qw])
+
+        if self._camera is not None and key == self._camera_key and \
+                np.max(np.abs(pose - self._camera_pose)) <= self.pose_tolerance:
+            return self._camera
+
         intrinsics = Intrinsics(
             width=rgb_shape[0], height=rgb_shape[1],
             fx=intrinsics.fy, fy=intrinsics.fx,
@@ -167,18 +299,76 @@ class RGBDStream_iOS(RGBDStream):
         position = np.array([extrinsics.tx, -extrinsics.ty, -extrinsics.tz])
         quaternion = np.array(
             [extrinsics.qx, -extrinsics.qy, -extrinsics.qz, extrinsics.qw])
+        quaternion /= np.linalg.norm(quaternion)
 
-        camera = Camera(intrinsics, position, quaternion_to_matrix(quaternion))
-        camera.inverse_rotation_matrix[[0, 1]] = \
-            camera.inverse_rotation_matrix[[1, 0]]
-        camera.inverse_rotation_matrix[1] *= -1.0
-        camera.rotation_matrix = np.linalg.inv(camera.inverse_rotation_matrix)
+        inverse_rotation_matrix = _DEVICE_AXES @ quaternion_to_matrix(quaternion).T
+        camera = Camera(intrinsics, position, inverse_rotation_matrix.T, inverse_rotation_matrix)
 
+        self._camera, self._camera_key, self._camera_pose = camera, key, pose
         return camera
 
+    def _capture_frame(self) -> None:
+        timestamp = time.perf_counter()
+
+        with self._buffers_lock:
+            index = next((i for i, buffer in enumerate(self._buffers)
+                          if i != self._latest_buffer and (buffer is None or buffer.readers == 0)), None)
+            if index is None and len(self._buffers) < self.max_buffers:
+                index = len(self._buffers)
+                self._buffers.append(None)
+
+        if index is None:
+            if self.dropped_frames == 0:
+                print(f'Warning: dropping RGBD frames, as consumers hold frames from all {self.max_buffers} buffers')
+            self.dropped_frames += 1
+            return
+
+        rgb = self.session.get_rgb_frame()
+        depth = self.session.get_depth_frame()
+        confidence = self.session.get_confidence_frame()
+        self._raw_rgb_shape = rgb.shape
+
+        shapes = (_rotated_shape(rgb.shape), _rotated_shape(depth.shape), _rotated_shape(confidence.shape))
+
+        buffer = self._buffers[index]
+        if buffer is None or not buffer.matches(*shapes):
+            buffer = self._buffers[index] = _FrameBuffer(*shapes)
+
+        # np.rot90 is the same counterclockwise rotation as cv2.ROTATE_90_COUNTERCLOCKWISE but as a view, so each
+        # image is converted straight into its buffer without intermediate copies
+        np.multiply(np.rot90(rgb), np.float32(1.0 / 255.0), out=buffer.rgb)
+        np.copyto(buffer.depth, np.rot90(depth), casting='same_kind')
+        np.copyto(buffer.confidence, np.rot90(confidence), casting='unsafe')
+        buffer.camera = self.get_camera()
+        buffer.timestamp = timestamp
+
+        with self._buffers_lock:
+            self._sequence_number += 1
+            buffer.sequence_number = self._sequence_number
+            self._latest_buffer = index
+
+        self._first_frame.set()
+        self.event.set()
+
     def get_frame(self) -> RGBDFrame:
-        rgb = self._get_rgb_frame()
-        depth = self._get_depth_frame()
-        confidence = self._get_confidence_frame()
-        camera = self.get_camera()
-        return RGBDFrame(rgb, depth, confidence, camera)
+        if not self.threaded:
+            rgb = self._get_rgb_frame()
+            depth = self._get_depth_frame()
+            confidence = self._get_confidence_frame()
+            camera = self.get_camera()
+            self._sequence_number += 1
+            return RGBDFrame(rgb, depth, confidence, camera, self.dtype, self._sequence_number, self._frame_timestamp)
+
+        self._first_frame.wait()
+
+        with self._buffers_lock:
+            buffer = self._buffers[self._latest_buffer]
+            buffer.readers += 1
+
+        frame = RGBDFrame(buffer.rgb, buffer.depth, buffer.confidence, buffer.camera, self.dtype, buffer.sequence_number, buffer.timestamp)
+        weakref.finalize(frame, self._release_buffer, buffer)
+        return frame
+
+    def _release_buffer(self, buffer: _FrameBuffer) -> None:
+        with self._buffers_lock:
+            buffer.readers -= 1
@@ -1,7 +1,16 @@
-from typing import List, Optional, Union
+from typing import Dict, List, Optional, Union
 import rtde_receive
 import rtde_control
 import numpy as np
+import time
+from simulated_rtde import SimulatedRTDE, SimulatedRTDEReceiveInterface, SimulatedRTDEControlInterface
+
+class RobotState:
+    def __init__(self) -> None:
+        self.data = np.zeros((3, 6))
+        self.pose, self.velocity, self.force = self.data
+        self.timestamp = -np.inf
+
 
 class Robot:
     TRANSLATION_ROTATION = (0, 1, 2, 3, 4, 5)
@@ -9,6 +18,33 @@ class Robot:
     TRANSLATION = (X, Y, Z)
     ROTATION = (THETA_X, THETA_Y, THETA_Z)
     TRANSLATION_ROTATION_SEPARATED = (TRANSLATION, ROTATION)
+    _TRANSLATION_SLICE = slice(X, Z + 1)
+    _ROTATION_SLICE = slice(THETA_X, THETA_Z + 1)
+    _axes_indexers: Dict = {}
+
+    @staticmethod
+    def _compile_axes(axes: Optional[Union[int, List[int], List[List[int]]]]):
+        if axes is None:
+            axes = Robot.TRANSLATION_ROTATION
+
+        if isinstance(axes, int):
+            return axes
+
+        key = tuple(tuple(subset) if isinstance(subset, (tuple, list)) else subset for subset in axes)
+
+        if key not in Robot._axes_indexers:
+            if all(isinstance(subset, tuple) for subset in key):
+                Robot._axes_indexers[key] = tuple(np.asarray(subset, dtype=np.intp) for subset in key)
+            else:
+                Robot._axes_indexers[key] = np.asarray(key, dtype=np.intp)
+
+        return Robot._axes_indexers[key]
+
+    @staticmethod
+    def _index_axes(translation_rotation: np.ndarray, indexer):
+        if isinstance(indexer, tuple):
+            return tuple(translation_rotation[subset] for subset in indexer)
+        return translation_rotation[indexer]
 
     @staticmethod
     def _extract_axes(translation_rotation: List[float], axes: Union[int, List[int]]):
@@ -59,46 +95,80 @@ class Robot:
     def zeroed_translation_rotation():
         return np.zeros(len(Robot.TRANSLATION_ROTATION))
 
-    def __init__(self, ip: str, translational_force_deadband: Optional[float] = None, rotational_force_deadband: Optional[float] = None, init_pose: Optional[List[float]] = None):
-        self.receive = rtde_receive.RTDEReceiveInterface(ip)
-        self.control = rtde_control.RTDEControlInterface(ip)
+    # the RTDE update period; without per-tick snapshots, getters share a fetch for at most this long
+    STATE_MAX_AGE = 0.002
+
+    def __init__(self, ip: str, translational_force_deadband: Optional[float] = None, rotational_force_deadband: Optional[float] = None, init_pose: Optional[List[float]] = None, simulation: Optional[SimulatedRTDE] = None):
+        if simulation is None:
+            self.receive = rtde_receive.RTDEReceiveInterface(ip)
+            self.control = rtde_control.RTDEControlInterface(ip)
+        else:
+            self.receive = SimulatedRTDEReceiveInterface(simulation)
+            self.control = SimulatedRTDEControlInterface(simulation)
+        self.simulation = simulation
         self.translational_force_deadband = translational_force_deadband
         self.rotational_force_deadband = rotational_force_deadband
         self._pose_input = Robot.zeroed_translation_rotation()
         self._velocity_input = Robot.zeroed_translation_rotation()
+        self.state = RobotState()
+        self._tick_driven = False
         if init_pose is not None:
             self.set_pose(init_pose)
         self.INIT_POSE = self.get_pose()
 
+    def _apply_force_deadband(self, force: np.ndarray) -> None:
+        for deadband, axes_slice in ((self.translational_force_deadband, Robot._TRANSLATION_SLICE), (self.rotational_force_deadband, Robot._ROTATION_SLICE)):
+            if deadband is None:
+                continue
+
+            component = force[axes_slice]
+            magnitude = np.linalg.norm(component)
+
+            if 0.0 < magnitude < deadband:
+                component *= max(0, 2 * magnitude - deadband) / magnitude
+
+    def snapshot(self) -> RobotState:
+        self._tick_driven = True
+        return self._fetch_state()
+
+    def _fetch_state(self) -> RobotState:
+        self.state.pose[:] = self.receive.getActualTCPPose()
+        self.state.velocity[:] = self.receive.getActualTCPSpeed()
+        self.state.force[:] = self.receive.getActualTCPForce()
+        self._apply_force_deadband(self.state.force)
+        self.state.timestamp = time.perf_counter()
+        return self.state
+
+    def invalidate(self) -> None:
+        self.state.timestamp = -np.inf
+
+    def _get_state(self) -> RobotState:
+        # once a loop calls snapshot() every tick, getters read that tick's state, commands included; loops that
+        # never snapshot fetch whenever the state is older than the RTDE period
+        if not self._tick_driven and time.perf_counter() - self.state.timestamp > Robot.STATE_MAX_AGE:
+            self._fetch_state()
+        return self.state
+
     def get_pose(self, axes: Optional[Union[int, List[int], List[List[int]]]] = None):
-        return self.get_axes(self.receive.getActualTCPPose(), axes)
+        return self._index_axes(self._get_state().pose, self._compile_axes(axes))
     
     def set_pose(self, input: Union[float, List[float]], axes: Optional[Union[int, List[int]]] = None, reset_unspecified: bool = False, speed: float = 0.25, acceleration: float = 1.2, asynchronous: bool = False):
         self.set_axes(self._pose_input, input, axes, reset_unspecified)
         self.control.moveL(self._pose_input, speed, acceleration, asynchronous)
 
     def get_velocity(self, axes: Optional[Union[int, List[int], List[List[int]]]] = None):
-        return self.get_axes(self.receive.getActualTCPSpeed(), axes)
+        return self._index_axes(self._get_state().velocity, self._compile_axes(axes))
     
     def set_velocity(self, input: Union[float, List[float]], axes: Optional[Union[int, List[int]]] = None, reset_unspecified: bool = False, acceleration: float = 0.25, time: float = 0.0):
         self.set_axes(self._velocity_input, input, axes, reset_unspecified)
         self.control.speedL(self._velocity_input, acceleration, time)
 
     def get_force(self, axes: Optional[Union[int, List[int], List[List[int]]]] = None):
-        force = np.array(self.receive.getActualTCPForce())
-
-        for deadband, axes_to_deadband in zip((self.translational_force_deadband, self.rotational_force_deadband), Robot.TRANSLATION_ROTATION_SEPARATED):
-            magnitude = np.linalg.norm(self.get_axes(force, axes_to_deadband))
-
-            if deadband is not None and magnitude < deadband:
-                new_magnitude = max(0, 2 * magnitude - deadband)
-                new_force = new_magnitude * force / magnitude
-                self.set_axes(force, new_force, axes_to_deadband)
-        
-        return self.get_axes(force, axes)
+        return self._index_axes(self._get_state().force, self._compile_axes(axes))
     
     def __enter__(self):
         self.control.zeroFtSensor()
+        self.invalidate()
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
@@ -0,0 +1,179 @@
+from __future__ import annotations
+from typing import Callable, List, Optional, Sequence
+from numpy.typing import NDArray
+from rate_scheduler import sleep_until
+import numpy as np
+import threading
+import time
+
+
+class SimulatedRTDE:
+    '''In-process stand-in for a UR arm behind RTDE, with a scripted external wrench.'''
+
+    def __init__(
+        self,
+        init_pose: Optional[Sequence[float]] = None,
+        external_force: Optional[Callable[[float], Sequence[float]]] = None,
+        latency: float = 0.0,
+        frequency: float = 500.0,
+        clock: Callable[[], float] = time.perf_counter,
+    ) -> None:
+        self.pose = np.zeros(6) if init_pose is None else np.array(init_pose, dtype=np.float64)
+        self.velocity = np.zeros(6)
+        self.external_force = external_force
+        self.latency = latency
+        self.frequency = frequency
+        self.clock = clock
+        self.force_offset = np.zeros(6)
+        self.lock = threading.Lock()
+
+        self._target_velocity = np.zeros(6)
+        self._acceleration = np.inf
+        self._target_pose = None
+        self._move_speed = 0.0
+        self.start_time = self.clock()
+        self._last_step_time = self.start_time
+
+    def t(self) -> float:
+        return self.clock() - self.start_time
+
+    def delay(self) -> None:
+        if self.latency > 0.0:
+            sleep_until(self.clock() + self.latency, clock=self.clock)
+
+    def _step_move(self, dt: float) -> None:
+        delta = self._target_pose - self.pose
+        distance = np.linalg.norm(delta[0:3])
+        step = self._move_speed * dt
+
+        if distance <= step or distance == 0.0:
+            self.pose[:] = self._target_pose
+            self.velocity[:] = 0.0
+            self._target_pose = None
+        else:
+            self.velocity[:] = delta * (self._move_speed / distance)
+            self.pose += self.velocity * dt
+
+    def _step_speed(self, dt: float) -> None:
+        dv = self._target_velocity - self.velocity
+        max_dv = self._acceleration * dt
+        dv_magnitude = np.linalg.norm(dv[0:3])
+
+        if dv_magnitude > max_dv:
+            dv *= max_dv / dv_magnitude
+
+        self.velocity += dv
+        # rotation vector is integrated component-wise, adequate for the small angular rates used here
+        self.pose += self.velocity * dt
+
+    def step(self) -> None:
+        now = self.clock()
+        dt = now - self._last_step_time
+        self._last_step_time = now
+
+        if dt <= 0.0:
+            return
+
+        if self._target_pose is not None:
+            self._step_move(dt)
+        else:
+            self._step_speed(dt)
+
+    def get_external_force(self) -> NDArray:
+        if self.external_force is None:
+            force = np.zeros(6)
+        else:
+            force = np.zeros(6)
+            external_force = np.asarray(self.external_force(self.t()), dtype=np.float64)
+            force[0:len(external_force)] = external_force
+
+        return force - self.force_offset
+
+    def speed(self, velocity: Sequence[float], acceleration: float) -> None:
+        with self.lock:
+            self.step()
+            self._target_pose = None
+            self._target_velocity[:] = velocity
+            self._acceleration = acceleration
+
+    def move(self, pose: Sequence[float], speed: float, asynchronous: bool) -> None:
+        with self.lock:
+            self.step()
+            self._target_velocity[:] = 0.0
+
+            if asynchronous:
+                self._target_pose = np.array(pose, dtype=np.float64)
+                self._move_speed = speed
+            else:
+                self.pose[:] = pose
+                self.velocity[:] = 0.0
+                self._target_pose = None
+
+    def zero_force(self) -> None:
+        with self.lock:
+            self.force_offset[:] = 0.0
+            self.force_offset[:] = self.get_external_force()
+
+
+class SimulatedRTDEReceiveInterface:
+    def __init__(self, simulation: SimulatedRTDE) -> None:
+        self.simulation = simulation
+
+    def _read(self, read: Callable[[], NDArray]) -> List[float]:
+        self.simulation.delay()
+        with self.simulation.lock:
+            self.simulation.step()
+            return read().tolist()
+
+    def getActualTCPPose(self) -> List[float]:
+        return self._read(lambda: self.simulation.pose)
+
+    def getActualTCPSpeed(self) -> List[float]:
+        return self._read(lambda: self.simulation.velocity)
+
+    def getActualTCPForce(self) -> List[float]:
+        return self._read(self.simulation.get_external_force)
+
+    def isConnected(self) -> bool:
+        return True
+
+    def disconnect(self) -> None:
+        pass
+
+
+class SimulatedRTDEControlInterface:
+    def __init__(self, simulation: SimulatedRTDE) -> None:
+        self.simulation = simulation
+
+    def speedL(self, xd: Sequence[float], acceleration: float = 0.25, time: float = 0.0) -> bool:
+        self.simulation.delay()
+        self.simulation.speed(xd, acceleration)
+        return True
+
+    def moveL(self, pose: Sequence[float], speed: float = 0.25, acceleration: float = 1.2, asynchronous: bool = False) -> bool:
+        self.simulation.delay()
+        self.simulation.move(pose, speed, asynchronous)
+        return True
+
+    def speedStop(self, a: float = 10.0) -> None:
+        self.speedL(np.zeros(6), a)
+
+    def zeroFtSensor(self) -> bool:
+        self.simulation.delay()
+        self.simulation.zero_force()
+        return True
+
+    def initPeriod(self) -> float:
+        return self.simulation.clock()
+
+    def waitPeriod(self, period_start: float) -> None:
+        sleep_until(period_start + 1.0 / self.simulation.frequency, clock=self.simulation.clock)
+
+    def isConnected(self) -> bool:
+        return True
+
+    def disconnect(self) -> None:
+        pass
+
+    def stopScript(self) -> None:
+        pass
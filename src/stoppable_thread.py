@@ -7,9 +7,10 @@ class StoppableThread(threading.Thread):
         self, 
         stoppable_method: Callable[[threading.Event, Dict[Any, Any]], None], 
         stoppable_method_args: Optional[Any] = None, 
-        name: Optional[str] = None
+        name: Optional[str] = None,
+        daemon: Optional[bool] = None
     ):
-        super().__init__(name=name)
+        super().__init__(name=name, daemon=daemon)
         self.stoppable_method = stoppable_method
         self.stoppable_method_args = stoppable_method_args
         self.stop_event = threading.Event()
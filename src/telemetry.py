@@ -0,0 +1,252 @@
+from __future__ import annotations
+from multiprocessing import resource_tracker, shared_memory
+from numpy.typing import NDArray
+from typing import Dict, List, Tuple
+import numpy as np
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+
+_MAGIC = 0x54454c454d455452
+_HEADER_SIZE = 64
+_LAYOUT_SIZE = 4096
+_RECORDS_OFFSET = _HEADER_SIZE + _LAYOUT_SIZE
+
+# header slots, as int64
+_MAGIC_INDEX = 0
+_COUNT_INDEX = 1
+_CAPACITY_INDEX = 2
+_LAYOUT_LENGTH_INDEX = 3
+_PID_INDEX = 4
+
+SEQUENCE_FIELD = '_sequence'
+TIME_FIELD = '_time'
+
+
+def record_dtype(signals: List[Tuple[str, Tuple[int, ...]]]) -> np.dtype:
+    fields = [(SEQUENCE_FIELD, np.uint64), (TIME_FIELD, np.float64)]
+    fields += [(name, np.float64, tuple(shape)) for name, shape in signals]
+    return np.dtype(fields, align=True)
+
+
+def _is_process_alive(pid: int) -> bool:
+    if os.name == 'nt':
+        # Windows frees a segment with its last handle, so an existing one always has a live owner
+        return True
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _map(shm: shared_memory.SharedMemory, capacity: int, dtype: np.dtype) -> Tuple[NDArray, NDArray]:
+    header = np.ndarray((_HEADER_SIZE // 8,), dtype=np.int64, buffer=shm.buf)
+    records = np.ndarray((capacity,), dtype=dtype, buffer=shm.buf, offset=_RECORDS_OFFSET)
+    return header, records
+
+
+class TelemetryPublisher:
+    '''Publishes signals into a shared memory ring that a TelemetrySubscriber reads from another process.'''
+
+    def __init__(self, name: str, signals: Dict[str, Tuple[int, ...]], capacity: int = 8192) -> None:
+        self.name = name
+        self.signals = [(signal, tuple(shape)) for signal, shape in signals.items()]
+        self.capacity = capacity
+        self.dtype = record_dtype(self.signals)
+
+        layout = json.dumps({'signals': self.signals}).encode()
+        if len(layout) > _LAYOUT_SIZE:
+            raise ValueError(f'Telemetry layout of {len(layout)} bytes exceeds {_LAYOUT_SIZE} bytes.')
+
+        size = _RECORDS_OFFSET + capacity * self.dtype.itemsize
+        try:
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        except FileExistsError:
+            self._unlink_stale(name)
+            self.shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        self.header, self.records = _map(self.shm, capacity, self.dtype)
+        self.shm.buf[_HEADER_SIZE:_HEADER_SIZE + len(layout)] = layout
+        self.header[_CAPACITY_INDEX] = capacity
+        self.header[_LAYOUT_LENGTH_INDEX] = len(layout)
+        self.header[_COUNT_INDEX] = 0
+        self.header[_PID_INDEX] = os.getpid()
+        self.header[_MAGIC_INDEX] = _MAGIC
+
+        self._sequence = self.records[SEQUENCE_FIELD]
+        self._time = self.records[TIME_FIELD]
+        self._columns = [self.records[signal] for signal, _ in self.signals]
+        self.count = 0
+
+    @staticmethod
+    def _unlink_stale(name: str) -> None:
+        # only a finished telemetry channel whose publisher process has exited is replaced; its layout may differ
+        existing = _attach(name)
+        header = np.ndarray((_HEADER_SIZE // 8,), dtype=np.int64, buffer=existing.buf)
+        magic, pid = int(header[_MAGIC_INDEX]), int(header[_PID_INDEX])
+        del header
+
+        if magic != _MAGIC or _is_process_alive(pid):
+            existing.close()
+            owner = 'is not a telemetry channel' if magic != _MAGIC else f'is in use by process {pid}'
+            raise FileExistsError(f"Shared memory '{name}' {owner}.")
+
+        print(f"Warning: replacing stale telemetry shared memory '{name}' of exited process {pid}")
+        existing.close()
+        existing.unlink()
+
+    def publish(self, *values) -> None:
+        if self.shm is None:
+            return
+
+        i = self.count % self.capacity
+        self._sequence[i] = 0
+        self._time[i] = time.perf_counter()
+
+        for column, value in zip(self._columns, values):
+            column[i] = value
+
+        self.count += 1
+        self._sequence[i] = self.count
+        self.header[_COUNT_INDEX] = self.count
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+
+        del self.header, self.records, self._sequence, self._time, self._columns
+        self.shm.close()
+        self.shm.unlink()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def _attach(name: str) -> shared_memory.SharedMemory:
+    try:
+        return shared_memory.SharedMemory(name=name, track=False)
+    except TypeError:
+        pass
+
+    # before Python 3.13 attaching registers the segment with this process' resource tracker, which would unlink
+    # it from under the publisher when the subscriber exits
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+class TelemetrySubscriber:
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.shm = _attach(name)
+
+        header = np.ndarray((_HEADER_SIZE // 8,), dtype=np.int64, buffer=self.shm.buf)
+        if header[_MAGIC_INDEX] != _MAGIC:
+            raise RuntimeError(f"Shared memory '{name}' is not a telemetry channel.")
+
+        layout_length = int(header[_LAYOUT_LENGTH_INDEX])
+        layout = json.loads(bytes(self.shm.buf[_HEADER_SIZE:_HEADER_SIZE + layout_length]))
+        self.signals = [(signal, tuple(shape)) for signal, shape in layout['signals']]
+        self.capacity = int(header[_CAPACITY_INDEX])
+        self.dtype = record_dtype(self.signals)
+        self.header, self.records = _map(self.shm, self.capacity, self.dtype)
+        self.count = 0
+        self.dropped = 0
+
+    def read(self) -> NDArray:
+        count = int(self.header[_COUNT_INDEX])
+        start = max(self.count, count - self.capacity)
+        self.dropped += start - self.count
+        self.count = count
+
+        if start == count:
+            return np.empty(0, dtype=self.dtype)
+
+        indices = np.arange(start, count) % self.capacity
+        records = self.records[indices]
+
+        # as in a seqlock, a record is intact if its sequence number was as expected both before and after the copy
+        sequence = np.arange(start + 1, count + 1, dtype=np.uint64)
+        is_intact = records[SEQUENCE_FIELD] == sequence
+        is_intact &= self.records[SEQUENCE_FIELD][indices] == sequence
+        self.dropped += int(np.count_nonzero(~is_intact))
+        return records[is_intact]
+
+    def close(self) -> None:
+        if self.shm is None:
+            return
+
+        del self.header, self.records
+        self.shm.close()
+        self.shm = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def spawn_viewer(name: str, signals: List[str] | None = None, window: float = 10.0, refresh_rate: int = 30, max_points: int = 1000) -> subprocess.Popen:
+    args = [sys.executable, __file__, name, '--window', str(window), '--refresh-rate', str(refresh_rate), '--max-points', str(max_points)]
+    if signals:
+        args += ['--signals'] + list(signals)
+    return subprocess.Popen(args)
+
+
+def view(name: str, signals: List[str] | None = None, window: float = 10.0, refresh_rate: int = 30, max_points: int = 1000) -> None:
+    # imported here so that publishing processes do not load matplotlib
+    from data_management import ColumnarDataStore
+    from realtime_figure import RealtimeFigureWindow
+
+    subscriber = TelemetrySubscriber(name)
+    shapes = dict(subscriber.signals)
+    signals = signals or list(shapes.keys())
+
+    # the history holds about a window of samples at up to 2 kHz, decimated to max_points when plotted
+    history = ColumnarDataStore(
+        column_names=['t'] + signals, shapes=[()] + [shapes[signal] for signal in signals],
+        capacity=int(2000 * window), ring=True)
+    figure = RealtimeFigureWindow(
+        rows=len(signals), refresh_rate=refresh_rate, blit=True,
+        subplot_options_set=[{'title': signal, 'xlim': (-window, 0.0)} for signal in signals])
+
+    try:
+        while True:
+            records = subscriber.read()
+            for record in records:
+                history.append_row((record[TIME_FIELD],) + tuple(record[signal] for signal in signals))
+
+            if len(history) > 0 and figure.is_due():
+                t = history.get_column('t')
+                step = max(1, len(t) // max_points)
+                x = t[::step] - t[-1]
+                figure.update([(x, history.get_column(signal)[::step]) for signal in signals])
+
+            time.sleep(0.25 / refresh_rate)
+    finally:
+        subscriber.close()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Plots the signals of a telemetry channel.')
+    parser.add_argument('name')
+    parser.add_argument('--signals', nargs='*')
+    parser.add_argument('--window', type=float, default=10.0)
+    parser.add_argument('--refresh-rate', type=int, default=30)
+    parser.add_argument('--max-points', type=int, default=1000)
+    args = parser.parse_args()
+
+    view(args.name, args.signals, args.window, args.refresh_rate, args.max_points)
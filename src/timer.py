@@ -12,8 +12,8 @@ class Timer:
         return dt
 
     def t(self) -> float:
-        return time.time() - self.start_time
+        return time.perf_counter() - self.start_time
 
     def reset(self) -> None:
-        self.start_time = time.time()
+        self.start_time = time.perf_counter()
         self.last_t = 0.0
@@ -44,3 +44,31 @@ class UrgencyMeterPID(UrgencyMeter):
 
     def reset_integral(self) -> None:
         self.int_A = 0.0
+
+    @staticmethod
+    def replay(alignment: NDArray, dt: float | NDArray, gains: NDArray, scale: float | NDArray = 1.0, integral_reset_threshold: float | NDArray = 0.2) -> NDArray:
+        # alignment is T or T x D and gains G x 3 (K_p, K_i, K_d); returns the urgencies as G x T or G x T x D
+        A = np.asarray(alignment, dtype=np.float64)
+        dt = np.asarray(dt, dtype=np.float64)
+        if dt.ndim == 1:
+            dt = dt.reshape((-1,) + (1,) * (A.ndim - 1))
+
+        previous_A = np.concatenate([np.zeros_like(A[:1]), A[:-1]], axis=0)
+        dAdt = (A - previous_A) / dt
+
+        # the integral restarts from zero after every reset, so it is the running sum since the latest reset
+        reset = (np.abs(A) < integral_reset_threshold) | (np.sign(previous_A) != np.sign(A))
+        running_sum = np.cumsum(A * dt, axis=0)
+        steps = np.arange(len(A)).reshape((-1,) + (1,) * (A.ndim - 1))
+        last_reset = np.maximum.accumulate(np.where(reset, steps, -1), axis=0)
+        running_sum_at_reset = np.where(last_reset >= 0, np.take_along_axis(running_sum, np.maximum(last_reset, 0), axis=0), 0.0)
+        int_A = running_sum - running_sum_at_reset
+
+        gains = np.asarray(gains, dtype=np.float64)
+        K_p, K_i, K_d = (gains[:, i].reshape((-1,) + (1,) * A.ndim) * scale for i in range(3))
+
+        return np.tanh(K_p * A + K_i * int_A + K_d * dAdt)
+
+    @staticmethod
+    def gain_grid(K_p: NDArray, K_i: NDArray, K_d: NDArray) -> NDArray:
+        return np.stack(np.meshgrid(K_p, K_i, K_d, indexing='ij'), axis=-1).reshape(-1, 3)
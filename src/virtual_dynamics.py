@@ -1,18 +1,216 @@
 from __future__ import annotations
+from typing import Tuple
 from numpy.typing import NDArray
+import numpy as np
+
+EULER = 'euler'
+SEMI_IMPLICIT = 'semi_implicit'
+EXACT = 'exact'
+
+_methods = (EULER, SEMI_IMPLICIT, EXACT)
+
+
+def _expm(A: NDArray, taylor_terms: int = 12) -> NDArray:
+    # batched matrix exponential over the leading axes by scaling and squaring of a truncated Taylor series
+    norm = np.max(np.sum(np.abs(A), axis=-2), axis=-1)
+    squarings = int(max(0, np.ceil(np.log2(np.max(norm, initial=0.0) + 1e-300)) + 1))
+    A = A / (2.0 ** squarings)
+
+    identity = np.broadcast_to(np.eye(A.shape[-1]), A.shape)
+    result = identity.copy()
+    term = identity.copy()
+
+    for i in range(1, taylor_terms + 1):
+        term = term @ A / i
+        result += term
+
+    for _ in range(squarings):
+        result = result @ result
+
+    return result
+
+
+class BatchedVirtualDynamics:
+    '''Mass-damper-spring bodies M a = F - B v - K x integrated together on one state array.'''
+
+    def __init__(self, M: float | NDArray, B: float | NDArray = 0.0, K: float | NDArray = 0.0, shape: Tuple[int, ...] | None = None, method: str = EULER, substeps: int = 1) -> None:
+        if method not in _methods:
+            raise ValueError(f"Unsupported method '{method}' received. Supported methods are: {', '.join(_methods)}.")
+
+        if not isinstance(substeps, int) or substeps < 1:
+            raise ValueError(f'Invalid value for substeps: {substeps}. Must be a counting number.')
+
+        if shape is None:
+            shape = np.broadcast_shapes(np.shape(M), np.shape(B), np.shape(K))
+
+        self.shape = tuple(shape)
+        self.method = method
+        self.substeps = substeps
+
+        self.state = np.zeros((3,) + self.shape)
+        self.x, self.v, self.a = self.state
+
+        self._F = np.empty(self.shape)
+        self._temp = np.empty(self.shape)
+        self._x_new = np.empty(self.shape)
+        self.set_parameters(M, B, K)
+
+    def set_parameters(self, M: float | NDArray, B: float | NDArray, K: float | NDArray) -> None:
+        self.M = np.broadcast_to(np.asarray(M, dtype=np.float64), self.shape).copy()
+        self.B = np.broadcast_to(np.asarray(B, dtype=np.float64), self.shape).copy()
+        self.K = np.broadcast_to(np.asarray(K, dtype=np.float64), self.shape).copy()
+        self._discretization_dt = None
+
+    def reset(self) -> None:
+        self.state[:] = 0.0
+
+    def _discretize(self, dt: float) -> None:
+        if self._discretization_dt == dt:
+            return
+
+        if self.method == SEMI_IMPLICIT:
+            self._implicit_scale = 1.0 / (1.0 + dt * self.B / self.M + dt * dt * self.K / self.M)
+        elif self.method == EXACT:
+            # augmented system d/dt [x, v, u] = [[0, 1, 0], [-K/M, -B/M, 1], [0, 0, 0]] [x, v, u] with u = F/M held over dt
+            A = np.zeros(self.shape + (3, 3))
+            A[..., 0, 1] = 1.0
+            A[..., 1, 0] = -self.K / self.M
+            A[..., 1, 1] = -self.B / self.M
+            A[..., 1, 2] = 1.0
+            self._transition = np.moveaxis(_expm(A * dt)[..., 0:2, :], (-2, -1), (0, 1)).copy()
+
+        self._discretization_dt = dt
+
+    def _step(self, dt: float) -> None:
+        x, v, a, F, temp = self.x, self.v, self.a, self._F, self._temp
+
+        np.multiply(self.B, v, out=temp)
+        np.subtract(F, temp, out=a)
+        np.multiply(self.K, x, out=temp)
+        a -= temp
+        a /= self.M
+
+        if self.method == EULER:
+            np.multiply(a, dt, out=temp)
+            v += temp
+            np.multiply(v, dt, out=temp)
+            x += temp
+        elif self.method == SEMI_IMPLICIT:
+            np.multiply(self.K, x, out=temp)
+            np.subtract(F, temp, out=temp)
+            temp *= dt
+            temp /= self.M
+            v += temp
+            v *= self._implicit_scale
+            np.multiply(v, dt, out=temp)
+            x += temp
+        else:
+            T, x_new = self._transition, self._x_new
+            np.divide(F, self.M, out=temp)
+            np.multiply(T[0, 0], x, out=x_new)
+            x_new += T[0, 1] * v
+            x_new += T[0, 2] * temp
+            v *= T[1, 1]
+            v += T[1, 0] * x
+            v += T[1, 2] * temp
+            x[...] = x_new
+
+    def apply_force(self, F: float | NDArray, dt: float) -> None:
+        self._F[...] = F
+        substep_dt = dt / self.substeps
+        self._discretize(substep_dt)
+
+        for _ in range(self.substeps):
+            self._step(substep_dt)
 
 
 class VirtualDynamics:
-    def __init__(self, M: float | NDArray) -> None:
-        self.M = M
-        self.x = 0.0
-        self.v = 0.0
-        self.a = 0.0
+    '''Single body view over a BatchedVirtualDynamics.'''
+
+    def __init__(self, M: float | NDArray, method: str = EULER, substeps: int = 1) -> None:
+        self.method = method
+        self.substeps = substeps
+        self.dynamics = None
+        self._parameters = {'M': M, 'B': 0.0, 'K': 0.0}
+        self._state = [0.0, 0.0, 0.0]
+
+    def _get_dynamics(self, shape: Tuple[int, ...] = ()) -> BatchedVirtualDynamics:
+        states = [self._get_state(i) for i in range(3)]
+        shape = np.broadcast_shapes(shape, *(np.shape(value) for value in self._parameters.values()), *(np.shape(state) for state in states))
+
+        if self.dynamics is None or self.dynamics.shape != (1,) + shape:
+            M, B, K = (np.asarray(self._parameters[key])[None] for key in 'MBK')
+            self.dynamics = BatchedVirtualDynamics(M, B, K, shape=(1,) + shape, method=self.method, substeps=self.substeps)
+            for i, state in enumerate(states):
+                self.dynamics.state[i, 0] = state
+        return self.dynamics
+
+    def _set_parameter(self, name: str, value: float | NDArray) -> None:
+        self._parameters[name] = value
+        if self.dynamics is not None:
+            self._get_dynamics().set_parameters(*(np.asarray(self._parameters[key])[None] for key in 'MBK'))
+
+    @property
+    def M(self) -> float | NDArray:
+        return self._parameters['M']
+
+    @M.setter
+    def M(self, value: float | NDArray) -> None:
+        self._set_parameter('M', value)
+
+    @property
+    def B(self) -> float | NDArray:
+        return self._parameters['B']
+
+    @B.setter
+    def B(self, value: float | NDArray) -> None:
+        self._set_parameter('B', value)
+
+    @property
+    def K(self) -> float | NDArray:
+        return self._parameters['K']
+
+    @K.setter
+    def K(self, value: float | NDArray) -> None:
+        self._set_parameter('K', value)
+
+    def _get_state(self, i: int) -> float | NDArray:
+        if self.dynamics is None:
+            return self._state[i]
+        return self.dynamics.state[i, 0]
+
+    def _set_state(self, i: int, value: float | NDArray) -> None:
+        if self.dynamics is None:
+            self._state[i] = value
+        else:
+            self._get_dynamics(np.shape(value)).state[i, 0] = value
+
+    @property
+    def x(self) -> float | NDArray:
+        return self._get_state(0)
+
+    @x.setter
+    def x(self, value: float | NDArray) -> None:
+        self._set_state(0, value)
+
+    @property
+    def v(self) -> float | NDArray:
+        return self._get_state(1)
+
+    @v.setter
+    def v(self, value: float | NDArray) -> None:
+        self._set_state(1, value)
+
+    @property
+    def a(self) -> float | NDArray:
+        return self._get_state(2)
+
+    @a.setter
+    def a(self, value: float | NDArray) -> None:
+        self._set_state(2, value)
 
     def apply_force(self, F: float | NDArray, dt: float) -> None:
-        self.a = F / self.M
-        self.v += self.a * dt
-        self.x += self.v * dt
+        self._get_dynamics(np.shape(F)).apply_force(np.asarray(F)[None], dt)
 
     def get_position(self) -> float | NDArray:
         return self.x
@@ -25,11 +223,7 @@ class VirtualDynamics:
 
 
 class SimpleVirtualDynamics(VirtualDynamics):
-    def __init__(self, M: float | NDArray, B: float | NDArray, K: float | NDArray) -> None:
-        super().__init__(M)
+    def __init__(self, M: float | NDArray, B: float | NDArray, K: float | NDArray, method: str = EULER, substeps: int = 1) -> None:
+        super().__init__(M, method, substeps)
         self.B = B
         self.K = K
-
-    def apply_force(self, F: float | NDArray, dt: float) -> None:
-        F_net = F - self.B * self.v - self.K * self.x
-        super().apply_force(F_net, dt)
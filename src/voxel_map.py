@@ -0,0 +1,273 @@
+from __future__ import annotations
+from numpy.typing import NDArray
+import numpy as np
+from typing import Dict, Tuple
+from rgbd_stream import RGBDFrame
+
+_KEY_BITS = 21
+_KEY_OFFSET = 1 << (_KEY_BITS - 1)
+_KEY_MASK = (1 << _KEY_BITS) - 1
+
+
+def _pack_keys(blocks: NDArray) -> NDArray:
+    blocks = blocks + _KEY_OFFSET
+    return (blocks[..., 0] << (2 * _KEY_BITS)) | (blocks[..., 1] << _KEY_BITS) | blocks[..., 2]
+
+
+def _unpack_keys(keys: NDArray) -> NDArray:
+    blocks = np.stack([keys >> (2 * _KEY_BITS), (keys >> _KEY_BITS) & _KEY_MASK, keys & _KEY_MASK], axis=-1)
+    return blocks - _KEY_OFFSET
+
+
+def _logit(probability: float) -> float:
+    return float(np.log(probability / (1.0 - probability)))
+
+
+class VoxelMap:
+    '''Sparse occupancy and colour map fused from RGBD frames into a bounded pool of voxel blocks.'''
+
+    def __init__(
+        self,
+        voxel_size: float = 0.01,
+        block_size: int = 8,
+        max_blocks: int = 4096,
+        hit_probability: float = 0.7,
+        miss_probability: float = 0.4,
+        min_log_odds: float = -2.0,
+        max_log_odds: float = 3.5,
+        max_color_weight: float = 50.0,
+        keep_radius: float = 0.5,
+        min_confidence: int = 1,
+        max_depth: float = 3.0,
+        pixel_stride: int = 1,
+    ) -> None:
+        if block_size & (block_size - 1):
+            raise ValueError(f'Invalid value for block_size: {block_size}. Must be a power of two.')
+
+        self.voxel_size = voxel_size
+        self.block_size = block_size
+        self.block_shift = block_size.bit_length() - 1
+        self.block_voxels = block_size ** 3
+        self.max_blocks = max_blocks
+        self.hit = _logit(hit_probability)
+        self.miss = _logit(miss_probability)
+        self.min_log_odds = min_log_odds
+        self.max_log_odds = max_log_odds
+        self.max_color_weight = max_color_weight
+        self.keep_radius = keep_radius
+        self.min_confidence = min_confidence
+        self.max_depth = max_depth
+        self.pixel_stride = pixel_stride
+
+        self.log_odds = np.zeros((max_blocks, self.block_voxels), dtype=np.float32)
+        self.color = np.zeros((max_blocks, self.block_voxels, 3), dtype=np.float32)
+        self.color_weight = np.zeros((max_blocks, self.block_voxels), dtype=np.float32)
+        # flat views indexed by slot * block_voxels + voxel, one index array gathers faster than two
+        self._flat_log_odds = self.log_odds.reshape(-1)
+        self._flat_color = self.color.reshape(-1, 3)
+        self._flat_color_weight = self.color_weight.reshape(-1)
+        self.block_keys = np.full(max_blocks, -1, dtype=np.int64)
+        self.block_positions = np.zeros((max_blocks, 3), dtype=np.float32)
+        self.last_used = np.zeros(max_blocks, dtype=np.int64)
+
+        z, y, x = np.unravel_index(np.arange(self.block_voxels), (block_size,) * 3)
+        self._local_centers = ((np.stack([x, y, z], axis=-1) + 0.5) * voxel_size).astype(np.float32)
+        self._block_extent = block_size * voxel_size
+        self._block_radius = np.sqrt(3.0) / 2.0 * self._block_extent
+
+        self.focus = None
+        self.frames = 0
+        self.evicted = 0
+        self.clear()
+
+    def clear(self) -> None:
+        self._slots: Dict[int, int] = {}
+        self._free_slots = list(range(self.max_blocks - 1, -1, -1))
+        self.log_odds[:] = 0.0
+        self.color[:] = 0.0
+        self.color_weight[:] = 0.0
+        self.block_keys[:] = -1
+
+    def __len__(self) -> int:
+        return len(self._slots)
+
+    def set_focus(self, point: NDArray | None) -> None:
+        self.focus = None if point is None else np.asarray(point, dtype=np.float64)
+
+    def _voxel_indices(self, XYZ: NDArray) -> NDArray:
+        return np.floor(XYZ / self.voxel_size).astype(np.int64)
+
+    def _split_indices(self, voxels: NDArray) -> Tuple[NDArray, NDArray]:
+        blocks = voxels >> self.block_shift
+        local = voxels & (self.block_size - 1)
+        local_index = (local[..., 2] * self.block_size + local[..., 1]) * self.block_size + local[..., 0]
+        return blocks, local_index
+
+    def _block_centers(self, slots: NDArray) -> NDArray:
+        return self.block_positions[slots] + np.float32(0.5 * self._block_extent)
+
+    def _evict(self, count: int, protected: NDArray) -> None:
+        used = np.flatnonzero(self.block_keys >= 0)
+        used = used[~np.isin(used, protected)]
+        order = np.argsort(self.last_used[used], kind='stable')
+        candidates = used[order]
+
+        if self.focus is not None:
+            distances = np.linalg.norm(self._block_centers(candidates) - self.focus, axis=-1)
+            # blocks near the focus are evicted last, in least recently used order
+            candidates = np.concatenate([candidates[distances > self.keep_radius], candidates[distances <= self.keep_radius]])
+
+        # evict an eighth of the pool at once so eviction does not run on every new block
+        evicted = candidates[:max(count, self.max_blocks // 8)]
+        for key in self.block_keys[evicted].tolist():
+            del self._slots[key]
+
+        self.block_keys[evicted] = -1
+        self.log_odds[evicted] = 0.0
+        self.color[evicted] = 0.0
+        self.color_weight[evicted] = 0.0
+        self._free_slots.extend(evicted.tolist())
+        self.evicted += len(evicted)
+
+    def _lookup_slots(self, keys: NDArray, allocate: bool) -> NDArray:
+        slots = np.fromiter((self._slots.get(key, -1) for key in keys.tolist()), dtype=np.int64, count=len(keys))
+
+        if allocate:
+            missing = np.flatnonzero(slots < 0)
+            if len(missing) > len(self._free_slots):
+                self._evict(len(missing) - len(self._free_slots), slots[slots >= 0])
+
+            missing = missing[:len(self._free_slots)]
+            for i in missing.tolist():
+                slot = self._free_slots.pop()
+                key = int(keys[i])
+                self._slots[key] = slot
+                self.block_keys[slot] = key
+                slots[i] = slot
+
+            if len(missing) > 0:
+                self.block_positions[slots[missing]] = _unpack_keys(keys[missing]) * self._block_extent
+
+        return slots
+
+    def _locate(self, voxels: NDArray, allocate: bool = False) -> Tuple[NDArray, NDArray]:
+        blocks, local_index = self._split_indices(voxels)
+        keys, inverse = np.unique(_pack_keys(blocks), return_inverse=True)
+        slots = self._lookup_slots(keys, allocate)
+        return slots[inverse.reshape(-1)], local_index
+
+    def occupied_voxels(self) -> Tuple[NDArray, NDArray]:
+        slots, voxels = np.nonzero(self.log_odds > 0.0)
+        return slots, voxels
+
+    def voxel_centers(self, slots: NDArray, voxels: NDArray) -> NDArray:
+        return self.block_positions[slots] + self._local_centers[voxels]
+
+    def _visible_blocks(self, frame: RGBDFrame) -> NDArray:
+        slots = np.flatnonzero(self.block_keys >= 0)
+        height, width = frame.depth.shape
+        xyz = frame.camera.world_to_screen(self._block_centers(slots), width, height)
+        intrinsics = frame.camera.intrinsics
+        radius = self._block_radius
+
+        margin = np.full(len(slots), radius, dtype=np.float32)
+        if not intrinsics.orthographic:
+            # blocks that reach behind the near plane project without bound
+            margin /= np.maximum(xyz[:, 2] - radius, 1e-6)
+        margin_x = margin * abs(intrinsics.fx) * width
+        margin_y = margin * abs(intrinsics.fy) * height
+
+        is_visible = xyz[:, 2] - radius < np.max(frame.depth)
+        is_visible &= xyz[:, 2] + radius > 0.0
+        is_visible &= (xyz[:, 0] + margin_x >= 0.0) & (xyz[:, 0] - margin_x <= width)
+        is_visible &= (xyz[:, 1] + margin_y >= 0.0) & (xyz[:, 1] - margin_y <= height)
+        return slots[is_visible]
+
+    def _carve(self, frame: RGBDFrame) -> None:
+        visible = self._visible_blocks(frame)
+        block_slots, voxels = np.nonzero(self.log_odds[visible] > 0.0)
+        if len(voxels) == 0:
+            return
+        slots = visible[block_slots]
+
+        is_free = ~frame.get_carved_points_mask(self.voxel_centers(slots, voxels))
+        index = slots[is_free] * self.block_voxels + voxels[is_free]
+
+        log_odds = self._flat_log_odds[index] + self.miss
+        self._flat_log_odds[index] = np.maximum(log_odds, self.min_log_odds)
+
+    def _integrate(self, XYZ: NDArray, rgb: NDArray) -> None:
+        # points are merged per voxel first, so blocks are only looked up for the (far fewer) distinct voxels
+        keys, inverse, counts = np.unique(_pack_keys(self._voxel_indices(XYZ)), return_inverse=True, return_counts=True)
+        inverse = inverse.reshape(-1)
+        color_sums = np.stack([np.bincount(inverse, weights=rgb[:, i], minlength=len(keys)) for i in range(3)], axis=-1)
+
+        slots, voxels = self._locate(_unpack_keys(keys), allocate=True)
+        allocated = slots >= 0
+        slots, counts, color_sums = slots[allocated], counts[allocated], color_sums[allocated]
+        index = slots * self.block_voxels + voxels[allocated]
+        self.last_used[slots] = self.frames
+
+        log_odds = self._flat_log_odds[index] + self.hit
+        self._flat_log_odds[index] = np.minimum(log_odds, self.max_log_odds)
+
+        weight = self._flat_color_weight[index]
+        total_weight = weight + counts
+        color = (self._flat_color[index] * weight[:, None] + color_sums) / total_weight[:, None]
+        self._flat_color[index] = color
+        self._flat_color_weight[index] = np.minimum(total_weight, self.max_color_weight)
+
+    def fuse(self, frame: RGBDFrame, focus: NDArray | None = None) -> None:
+        if focus is not None:
+            self.set_focus(focus)
+
+        self.frames += 1
+        self._carve(frame)
+
+        # a stride of 2 still hits every voxel while the pixel footprint is below half a voxel
+        pixels = (slice(None, None, self.pixel_stride), slice(None, None, self.pixel_stride))
+        depth = frame.depth[pixels]
+        valid = frame.confidence[pixels] >= self.min_confidence
+        valid &= depth > 0.0
+        valid &= depth <= self.max_depth
+
+        self._integrate(frame.XYZ[pixels][valid], frame.resized_rgb[pixels][valid])
+
+    def occupancy(self, XYZ: NDArray) -> NDArray:
+        XYZ = np.asarray(XYZ, dtype=np.float64)
+        points = XYZ.reshape(-1, 3)
+        slots, local_index = self._locate(self._voxel_indices(points))
+
+        log_odds = np.zeros(len(points), dtype=np.float32)
+        known = slots >= 0
+        log_odds[known] = self.log_odds[slots[known], local_index[known]]
+
+        return (1.0 / (1.0 + np.exp(-log_odds))).reshape(XYZ.shape[:-1])
+
+    def is_occupied(self, XYZ: NDArray, threshold: float = 0.5) -> NDArray:
+        return self.occupancy(XYZ) > threshold
+
+    def query_sphere(self, center: NDArray, radius: float) -> Tuple[NDArray, NDArray, NDArray]:
+        center = np.asarray(center, dtype=np.float64)
+        block_extent = self.block_size * self.voxel_size
+        low = np.floor((center - radius) / block_extent).astype(np.int64)
+        high = np.floor((center + radius) / block_extent).astype(np.int64)
+
+        blocks = np.stack(np.meshgrid(*(np.arange(l, h + 1) for l, h in zip(low, high)), indexing='ij'), axis=-1).reshape(-1, 3)
+        slots = self._lookup_slots(_pack_keys(blocks), allocate=False)
+        slots = slots[slots >= 0]
+
+        block_slots, voxels = np.nonzero(self.log_odds[slots] > 0.0)
+        slots = slots[block_slots]
+        centers = self.voxel_centers(slots, voxels)
+        center = center.astype(np.float32)
+
+        inside = np.einsum('ij,ij->i', centers - center, centers - center) <= radius * radius
+        slots, voxels, centers = slots[inside], voxels[inside], centers[inside]
+
+        probabilities = 1.0 / (1.0 + np.exp(-self.log_odds[slots, voxels]))
+        return centers, self.color[slots, voxels], probabilities
+
+    def get_points(self) -> Tuple[NDArray, NDArray]:
+        slots, voxels = self.occupied_voxels()
+        return self.voxel_centers(slots, voxels), self.color[slots, voxels]
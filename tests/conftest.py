@@ -0,0 +1,9 @@
+import sys
+import os
+
+# Add src/ to the Python path if not already added, as notebooks/preamble.py does
+
+src_path = os.path.abspath(os.path.join(os.path.dirname(__file__), '../src'))
+
+if src_path not in sys.path:
+    sys.path.append(src_path)
@@ -0,0 +1,60 @@
+import os
+import numpy as np
+from column_stream import COLUMN_FILE_EXTENSION, ColumnStreamWriter, read_columns
+
+COLUMNS = {'t': (np.float64, ()), 'x': (np.float32, (3,))}
+
+
+def write_rows(dir_path, rows):
+    with ColumnStreamWriter(dir_path, COLUMNS, chunk_size=4, queue_chunks=2) as writer:
+        for i in range(rows):
+            writer.append(float(i), np.full(3, i, dtype=np.float32))
+            writer.flush()
+    return writer
+
+
+def test_written_rows_read_back(tmp_path):
+    writer = write_rows(str(tmp_path), 10)
+    assert writer.dropped == 0
+
+    for mmap in (True, False):
+        columns = read_columns(str(tmp_path), mmap=mmap)
+        np.testing.assert_array_equal(columns['t'], np.arange(10))
+        np.testing.assert_array_equal(columns['x'], np.repeat(np.arange(10, dtype=np.float32)[:, None], 3, axis=1))
+
+
+def test_truncated_column_reads_longest_complete_prefix(tmp_path):
+    write_rows(str(tmp_path), 10)
+
+    # cut the last column off in the middle of its eighth row, as a crash mid-write would
+    path = os.path.join(str(tmp_path), 'x' + COLUMN_FILE_EXTENSION)
+    with open(path, 'r+b') as file:
+        file.truncate(7 * 3 * 4 + 5)
+
+    columns = read_columns(str(tmp_path))
+    np.testing.assert_array_equal(columns['t'], np.arange(7))
+    assert columns['x'].shape == (7, 3)
+
+
+def test_empty_column_reads_no_rows(tmp_path):
+    write_rows(str(tmp_path), 3)
+    open(os.path.join(str(tmp_path), 't' + COLUMN_FILE_EXTENSION), 'wb').close()
+
+    columns = read_columns(str(tmp_path))
+    assert columns['t'].shape == (0,)
+    assert columns['x'].shape == (0, 3)
+
+
+def test_full_queue_drops_and_counts_rows(tmp_path):
+    writer = ColumnStreamWriter(str(tmp_path), COLUMNS, chunk_size=2, queue_chunks=1)
+    writer._thread.stop()
+    writer._thread.join()
+
+    # with the writer thread stopped, the only chunk fills and is never returned
+    for i in range(5):
+        writer.append(float(i), np.zeros(3, dtype=np.float32))
+    assert writer.rows == 2
+    assert writer.dropped == 3
+
+    for file in writer._files.values():
+        file.close()
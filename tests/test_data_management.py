@@ -0,0 +1,34 @@
+import numpy as np
+import pytest
+from data_management import ColumnarDataStore, RowShapeError
+
+
+def test_ring_keeps_latest_rows_in_order():
+    store = ColumnarDataStore(column_names=['t', 'x'], capacity=4, ring=True)
+
+    for i in range(3):
+        store.append_row((i, [i, -i]))
+    np.testing.assert_array_equal(store['t'], [0, 1, 2])
+
+    for i in range(3, 11):
+        store.append_row((i, [i, -i]))
+    assert len(store) == 4
+    np.testing.assert_array_equal(store['t'], [7, 8, 9, 10])
+    np.testing.assert_array_equal(store['x'], [[7, -7], [8, -8], [9, -9], [10, -10]])
+
+
+def test_growing_store_keeps_every_row():
+    store = ColumnarDataStore(column_names=['t'], capacity=2)
+
+    for i in range(9):
+        store.append_row((i,))
+    np.testing.assert_array_equal(store['t'], np.arange(9))
+
+
+def test_rejected_row_leaves_store_unchanged():
+    store = ColumnarDataStore(column_names=['t', 'x'], capacity=4, ring=True)
+    store.append_row((0, [0, 0]))
+
+    with pytest.raises(RowShapeError):
+        store.append_row((1, [1, 1, 1]))
+    np.testing.assert_array_equal(store['t'], [0])
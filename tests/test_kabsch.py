@@ -0,0 +1,60 @@
+import numpy as np
+from kabsch import OnlineKabsch, kabsch, trimmed_kabsch
+
+
+def random_transform(rng):
+    R, _ = np.linalg.qr(rng.normal(size=(3, 3)))
+    if np.linalg.det(R) < 0:
+        R[:, 0] *= -1
+    return R, rng.normal(size=3)
+
+
+def test_kabsch_recovers_rigid_transform():
+    rng = np.random.default_rng(0)
+    R, t = random_transform(rng)
+    P = rng.normal(size=(20, 3))
+
+    R_fit, t_fit = kabsch(P, P @ R.T + t)
+    np.testing.assert_allclose(R_fit, R, atol=1e-12)
+    np.testing.assert_allclose(t_fit, t, atol=1e-12)
+
+
+def test_online_matches_batch_kabsch():
+    rng = np.random.default_rng(1)
+    R, t = random_transform(rng)
+    P = rng.normal(size=(300, 3))
+    Q = P @ R.T + t + rng.normal(scale=0.001, size=P.shape)
+
+    # nothing is trimmed from clean data, so the running fit sees the same pairs as the batch fit
+    online = OnlineKabsch(inlier_fraction=1.0, seed=0)
+    for p, q in zip(P, Q):
+        online.add(p, q)
+
+    assert online.rejected == 0
+    R_batch, t_batch = kabsch(P, Q)
+    np.testing.assert_allclose(online.rotation, R_batch, atol=1e-9)
+    np.testing.assert_allclose(online.translation, t_batch, atol=1e-9)
+
+    residuals = np.linalg.norm(P @ R_batch.T + t_batch - Q, axis=-1)
+    np.testing.assert_allclose(online.rms, np.sqrt(np.mean(residuals ** 2)), rtol=1e-6)
+    assert online.has_converged()
+
+
+def test_online_rejects_outliers_like_trimmed_kabsch():
+    rng = np.random.default_rng(2)
+    R, t = random_transform(rng)
+    P = rng.normal(size=(300, 3))
+    Q = P @ R.T + t + rng.normal(scale=0.001, size=P.shape)
+    outliers = rng.random(len(P)) < 0.1
+    Q[outliers] += rng.normal(scale=0.5, size=(np.count_nonzero(outliers), 3))
+
+    online = OnlineKabsch(seed=0)
+    accepted = np.array([online.add(p, q) for p, q in zip(P, Q)])
+
+    # pairs are accepted unconditionally during warmup and trimmed once it ends
+    assert not np.any(accepted[online.warmup:] & outliers[online.warmup:])
+    assert online.count + online.rejected == len(P)
+    R_trimmed, t_trimmed, _ = trimmed_kabsch(P, Q, inlier_fraction=0.85)
+    np.testing.assert_allclose(online.rotation, R_trimmed, atol=1e-3)
+    np.testing.assert_allclose(online.translation, t_trimmed, atol=1e-3)
+    np.testing.assert_allclose(online.matrix()[:3, :3], R, atol=1e-3)
@@ -0,0 +1,84 @@
+import numpy as np
+import pytest
+
+pytest.importorskip('torch')
+
+from phrase_embedding import READ_CHUNK_SIZE, convert_word2vec, read_word_vectors
+
+WORDS = ['left', 'right', 'up', 'down', 'slowly']
+DIM = 4
+
+
+def write_word2vec(path, words, vectors, binary, newlines=True):
+    with open(path, 'wb') as file:
+        file.write(f'{len(words)} {vectors.shape[1]}\n'.encode())
+        for word, vector in zip(words, vectors):
+            if binary:
+                file.write(word.encode() + b' ' + vector.astype('<f4').tobytes() + (b'\n' if newlines else b''))
+            else:
+                file.write((word + ' ' + ' '.join(repr(float(value)) for value in vector) + '\n').encode())
+
+
+@pytest.fixture
+def vectors():
+    return np.random.default_rng(0).normal(size=(len(WORDS), DIM)).astype(np.float32)
+
+
+@pytest.mark.parametrize('binary', [True, False])
+@pytest.mark.parametrize('newlines', [True, False])
+def test_convert_round_trips(tmp_path, vectors, binary, newlines):
+    model_path = str(tmp_path / 'model.bin')
+    write_word2vec(model_path, WORDS, vectors, binary, newlines)
+
+    assert convert_word2vec(model_path, str(tmp_path / 'vectors'), binary=binary, dtype=np.float32) == []
+    words, converted = read_word_vectors(str(tmp_path / 'vectors'))
+    assert words == WORDS
+    np.testing.assert_array_equal(converted, vectors)
+
+
+def test_vocabulary_pruning(tmp_path, vectors):
+    model_path = str(tmp_path / 'model.bin')
+    write_word2vec(model_path, WORDS, vectors, binary=True)
+
+    missing = convert_word2vec(model_path, str(tmp_path / 'vectors'), binary=True, vocabulary=['down', 'left', 'sideways'])
+    words, converted = read_word_vectors(str(tmp_path / 'vectors'))
+    assert missing == ['sideways']
+    assert words == ['left', 'down']
+    assert converted.dtype == np.float16
+    np.testing.assert_array_equal(converted, vectors[[0, 3]].astype(np.float16))
+
+
+def test_records_spanning_read_chunks(tmp_path):
+    dim = READ_CHUNK_SIZE // 4 // 3 + 1
+    words = [f'word{i}' for i in range(5)]
+    vectors = np.random.default_rng(1).normal(size=(len(words), dim)).astype(np.float32)
+    model_path = str(tmp_path / 'model.bin')
+    write_word2vec(model_path, words, vectors, binary=True)
+
+    convert_word2vec(model_path, str(tmp_path / 'vectors'), binary=True, dtype=np.float32)
+    read_words, converted = read_word_vectors(str(tmp_path / 'vectors'))
+    assert read_words == words
+    np.testing.assert_array_equal(converted, vectors)
+
+
+def test_truncated_binary_file_raises(tmp_path, vectors):
+    model_path = str(tmp_path / 'model.bin')
+    write_word2vec(model_path, WORDS, vectors, binary=True)
+    with open(model_path, 'r+b') as file:
+        file.seek(-6, 2)
+        file.truncate()
+
+    with pytest.raises(ValueError, match='Truncated'):
+        convert_word2vec(model_path, str(tmp_path / 'vectors'), binary=True)
+
+
+def test_matches_gensim(tmp_path, vectors):
+    gensim = pytest.importorskip('gensim')
+    model_path = str(tmp_path / 'model.bin')
+    write_word2vec(model_path, WORDS, vectors, binary=True)
+
+    keyed_vectors = gensim.models.KeyedVectors.load_word2vec_format(model_path, binary=True)
+    convert_word2vec(model_path, str(tmp_path / 'vectors'), binary=True, dtype=np.float32)
+    words, converted = read_word_vectors(str(tmp_path / 'vectors'))
+    assert words == list(keyed_vectors.index_to_key)
+    np.testing.assert_array_equal(converted, keyed_vectors.vectors)
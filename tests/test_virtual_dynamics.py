@@ -0,0 +1,64 @@
+import numpy as np
+from virtual_dynamics import EULER, EXACT, SEMI_IMPLICIT, BatchedVirtualDynamics, SimpleVirtualDynamics
+
+M = np.array([1.0, 10.0, 2.0])
+B = np.array([4.0, 25.0, 1.0])
+K = np.array([0.0, 0.0, 50.0])
+F = np.array([2.0, -5.0, 10.0])
+
+
+def simulate(method, dt, steps, substeps=1):
+    dynamics = BatchedVirtualDynamics(M, B, K, method=method, substeps=substeps)
+    for _ in range(steps):
+        dynamics.apply_force(F, dt)
+    return dynamics
+
+
+def test_exact_matches_analytic_damper():
+    dynamics = BatchedVirtualDynamics(M[:2], B[:2], method=EXACT)
+    for _ in range(7):
+        dynamics.apply_force(F[:2], 0.05)
+
+    t = 7 * 0.05
+    v = F[:2] / B[:2] * (1.0 - np.exp(-B[:2] / M[:2] * t))
+    x = F[:2] / B[:2] * t - M[:2] / B[:2] * v
+    np.testing.assert_allclose(dynamics.v, v, rtol=1e-9)
+    np.testing.assert_allclose(dynamics.x, x, rtol=1e-9)
+
+
+def test_exact_is_independent_of_step_size():
+    coarse = simulate(EXACT, 0.1, 10)
+    fine = simulate(EXACT, 0.001, 1000)
+    np.testing.assert_allclose(coarse.x, fine.x, rtol=1e-8, atol=1e-12)
+    np.testing.assert_allclose(coarse.v, fine.v, rtol=1e-8, atol=1e-12)
+
+
+def test_semi_implicit_converges_to_exact():
+    exact = simulate(EXACT, 0.001, 1000)
+    errors = [np.max(np.abs(simulate(SEMI_IMPLICIT, 1.0 / steps, steps).x - exact.x)) for steps in (100, 1000)]
+    assert errors[1] < errors[0] / 5.0
+    assert errors[1] < 1e-3
+
+
+def test_semi_implicit_and_exact_reach_the_same_steady_state():
+    exact = simulate(EXACT, 0.01, 10000)
+    semi_implicit = simulate(SEMI_IMPLICIT, 0.01, 10000)
+    np.testing.assert_allclose(semi_implicit.v, exact.v, atol=1e-6)
+    np.testing.assert_allclose(semi_implicit.x[2], F[2] / K[2], rtol=1e-6)
+    np.testing.assert_allclose(exact.x[2], F[2] / K[2], rtol=1e-6)
+
+
+def test_semi_implicit_is_stable_where_euler_is_not():
+    dt = 0.5
+    assert np.all(np.isfinite(simulate(SEMI_IMPLICIT, dt, 200).x))
+    assert not np.all(np.abs(simulate(EULER, dt, 200).x) < 1e3)
+
+
+def test_single_body_view_matches_batch():
+    batch = simulate(SEMI_IMPLICIT, 0.01, 50, substeps=4)
+    for i in range(len(M)):
+        body = SimpleVirtualDynamics(M[i], B[i], K[i], method=SEMI_IMPLICIT, substeps=4)
+        for _ in range(50):
+            body.apply_force(F[i], 0.01)
+        np.testing.assert_allclose(body.x, batch.x[i])
+        np.testing.assert_allclose(body.v, batch.v[i])